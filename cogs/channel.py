@@ -2,16 +2,52 @@ import discord
 from discord.ext import commands, tasks
 from discord import option
 import re
+import asyncio
+import itertools
 import logging
+import json
+import time
 from db.connection import database
-from db.actions import get_user_channel, create_user_channel, delete_user_channel, get_welcome_message, set_welcome_message, get_all_user_channels
+from db.actions import get_user_channel, create_user_channel, delete_user_channel, get_welcome_message, set_welcome_message, get_all_user_channels, delete_user_channels_bulk, create_user_channels_bulk
 
-async def _set_channel_owner_permissions(channel: discord.TextChannel, member: discord.Member):
-    """Give the channel owner manage_permissions so they can control who views their channel."""
+try:
+    import orjson
+    _json_loads = orjson.loads
+except ImportError:
+    _json_loads = json.loads
+
+_VALID_NAME_RE = re.compile(r'^[a-z0-9_-]+$')
+# Allowed characters, and no leading/trailing hyphen or underscore
+_VALID_FULL_RE = re.compile(r'^[a-z0-9](?:[a-z0-9_-]*[a-z0-9])?$')
+_CLEAN_NAME_RE = re.compile(r'[^a-z0-9_-]')
+_MSG_LINK_RE = re.compile(r'discord(?:app)?\.com/channels/(\d+)/(\d+)/(\d+)')
+_CODEFENCE_RE = re.compile(r'^```(?:json)?\s*\n?(.*?)\n?```\s*$', re.S)
+
+# How long a cached welcome template is trusted before re-reading it from the DB
+_WELCOME_CACHE_TTL = 30 * 60
+
+
+_WELCOME_PLACEHOLDER_RE = re.compile(r"\{(name|channel)\}")
+
+
+def _render_welcome(template: str, name: str, channel: str) -> str:
+    """Substitute {name} and {channel} into a welcome template in a single pass."""
+    values = {"name": name, "channel": channel}
+    return _WELCOME_PLACEHOLDER_RE.sub(lambda m: values[m.group(1)], template)
+
+
+_OWNER_OVERWRITE = discord.PermissionOverwrite(manage_permissions=True)
+
+
+async def _set_channel_owner_permissions(channel: discord.TextChannel, member: discord.Member, force: bool = False):
+    """Give the channel owner manage_permissions so they can control who views their channel.
+    Skips the API call if the overwrite is already exactly that, unless force is set."""
+    if not force and channel.overwrites.get(member) == _OWNER_OVERWRITE:
+        return
     await channel.set_permissions(
         member,
         manage_permissions=True,
-        reason=f"Personal channel owner permissions for {member}"
+        reason=f"Personal channel owner permissions for {member.name}"
     )
 
 
@@ -23,21 +59,23 @@ def _generate_channel_name(member: discord.Member, category: discord.CategoryCha
         member.name.lower().replace(" ", "-"),
     ]
 
+    existing = {c.name for c in category.channels}
+
     for candidate in candidates:
         # Clean the name to only include valid characters
-        base_name = re.sub(r'[^a-z0-9_-]', '', candidate)
+        base_name = _CLEAN_NAME_RE.sub('', candidate)
         if not base_name:
             continue
 
         # Try the base name first
-        if not discord.utils.get(category.channels, name=base_name):
+        if base_name not in existing:
             return base_name
 
         # Try with numeric suffix
         suffix = 1
         while True:
             channel_name = f"{base_name}-{suffix}"
-            if not discord.utils.get(category.channels, name=channel_name):
+            if channel_name not in existing:
                 return channel_name
             suffix += 1
 
@@ -52,7 +90,7 @@ class ChannelManagement(commands.Cog):
         """Validate channel name according to Discord's specifications.
         Returns (is_valid, error_message)"""
         # Check length (1-100 characters)
-        if len(name) < 1:
+        if not name:
             return False, "Channel name cannot be empty."
         if len(name) > 100:
             return False, "Channel name must be 100 characters or less."
@@ -60,16 +98,15 @@ class ChannelManagement(commands.Cog):
         # Discord automatically converts channel names to lowercase and replaces spaces with hyphens
         # But we should validate that the resulting name would be valid
         normalized = name.lower().replace(" ", "-")
+        if _VALID_FULL_RE.match(normalized):
+            return True, ""
         
         # Check for invalid characters (only lowercase letters, numbers, hyphens, and underscores allowed)
-        if not re.match(r'^[a-z0-9_-]+$', normalized):
+        if not _VALID_NAME_RE.match(normalized):
             return False, "Channel name can only contain letters, numbers, hyphens, and underscores."
         
-        # Cannot start or end with hyphen or underscore
-        if normalized.startswith(("-", "_")) or normalized.endswith(("-", "_")):
-            return False, "Channel name cannot start or end with a hyphen or underscore."
-        
-        return True, ""
+        # Otherwise it starts or ends with a hyphen or underscore
+        return False, "Channel name cannot start or end with a hyphen or underscore."
     
     @channels.command(description="Give yourself a personal channel")
     @option("name", description="Name of the channel")
@@ -96,17 +133,14 @@ class ChannelManagement(commands.Cog):
                         ephemeral=True
                     )
                     return
-                # Channel was deleted but record still exists - clear the database entry
-                await delete_user_channel(guild.id, ctx.author.id)
+                # Channel was deleted but record still exists - create_user_channel below overwrites it
             
             # Find or create the "Personal Channels" category
-            category = discord.utils.get(guild.categories, name="Personal Channels")
-            if not category:
-                category = await guild.create_category("Personal Channels")
+            category = await self._get_personal_category(guild)
             
             # Check if channel already exists in this category
-            existing_channel = discord.utils.get(guild.channels, name=name.lower().replace(" ", "-"), category=category)
-            if existing_channel:
+            existing = {c.name for c in category.channels}
+            if name.lower().replace(" ", "-") in existing:
                 await ctx.respond(f"Channel `{name}` already exists in the Personal Channels category.", ephemeral=True)
                 return
             
@@ -190,10 +224,7 @@ class ChannelManagement(commands.Cog):
             return
 
         try:
-            # Check if the user already has a different personal channel - delete the old mapping
-            existing_channel_id = await get_user_channel(guild.id, user.id)
-            if existing_channel_id and existing_channel_id != channel.id:
-                await delete_user_channel(guild.id, user.id)
+            # Any existing mapping for this user is overwritten by create_user_channel below
 
             # Check if the channel is already assigned to someone else - reassign it
             query = "SELECT user_id FROM user_private_channels WHERE guild_id = :guild_id AND channel_id = :channel_id"
@@ -235,16 +266,14 @@ class ChannelManagement(commands.Cog):
 
         try:
             # Parse message link: https://discord.com/channels/GUILD_ID/CHANNEL_ID/MESSAGE_ID
-            parts = message_link.strip().split("/")
-            if len(parts) < 3:
+            link_match = _MSG_LINK_RE.search(message_link)
+            if not link_match:
                 await ctx.respond("Invalid message link. Right-click a message and select 'Copy Message Link'.", ephemeral=True)
                 return
 
-            try:
-                channel_id = int(parts[-2])
-                message_id = int(parts[-1])
-            except ValueError:
-                await ctx.respond("Invalid message link. Right-click a message and select 'Copy Message Link'.", ephemeral=True)
+            link_guild_id, channel_id, message_id = map(int, link_match.groups())
+            if link_guild_id != guild.id:
+                await ctx.respond("That message is from a different server.", ephemeral=True)
                 return
 
             # Fetch the message
@@ -265,9 +294,10 @@ class ChannelManagement(commands.Cog):
 
             # Store the welcome message
             await set_welcome_message(guild.id, source_message.content, guild.name)
+            self._welcome_cache[guild.id] = (source_message.content, time.monotonic())
 
             # Show a preview with example substitutions
-            preview = source_message.content.replace("{name}", ctx.author.mention).replace("{channel}", "#example-channel")
+            preview = _render_welcome(source_message.content, ctx.author.mention, "#example-channel")
             await ctx.respond(
                 f"Welcome message updated!\n\n**Preview:**\n{preview}",
                 ephemeral=True
@@ -298,36 +328,42 @@ class ChannelManagement(commands.Cog):
                 existing_channel = guild.get_channel(existing_channel_id)
                 if existing_channel:
                     return
-                # Channel was deleted but record still exists - clear the database entry
-                await delete_user_channel(guild.id, member.id)
+                # Channel was deleted but record still exists - create_user_channel below overwrites it
 
-            # Find or create the "Personal Channels" category
-            category = discord.utils.get(guild.categories, name="Personal Channels")
-            if not category:
-                category = await guild.create_category("Personal Channels")
+            # Fetch the welcome template while we create the channel
+            welcome_task = asyncio.create_task(self._get_welcome_template(guild.id))
+
+            try:
+                # Find or create the "Personal Channels" category
+                category = await self._get_personal_category(guild)
 
-            # Generate channel name
-            channel_name = _generate_channel_name(member, category)
+                # Generate channel name
+                channel_name = _generate_channel_name(member, category)
 
-            # Create the channel
-            channel = await guild.create_text_channel(channel_name, category=category)
+                # Create the channel
+                channel = await guild.create_text_channel(channel_name, category=category)
 
-            # Give the user manage_permissions so they can control who views their channel
-            await _set_channel_owner_permissions(channel, member)
+                # Give the user manage_permissions so they can control who views their channel
+                await _set_channel_owner_permissions(channel, member)
 
-            # Store the channel in the database
-            await create_user_channel(
-                guild_id=guild.id,
-                user_id=member.id,
-                channel_id=channel.id,
-                username=str(member),
-                guild_name=guild.name
-            )
+                # Store the channel in the database
+                await create_user_channel(
+                    guild_id=guild.id,
+                    user_id=member.id,
+                    channel_id=channel.id,
+                    username=str(member),
+                    guild_name=guild.name
+                )
+            except BaseException:
+                # Stop the template fetch and retrieve its result so a failure isn't reported as unretrieved
+                welcome_task.cancel()
+                welcome_task.add_done_callback(lambda t: t.cancelled() or t.exception())
+                raise
 
             # Send welcome message if configured
-            welcome_template = await get_welcome_message(guild.id)
+            welcome_template = await welcome_task
             if welcome_template:
-                welcome_msg = welcome_template.replace("{name}", member.mention).replace("{channel}", channel.mention)
+                welcome_msg = _render_welcome(welcome_template, member.mention, channel.mention)
                 await channel.send(welcome_msg)
 
             # Give them the active journaling role
@@ -351,20 +387,59 @@ class ChannelManagement(commands.Cog):
 
     def __init__(self, bot):
         self.bot = bot
+        # guild_id -> "Personal Channels" category id
+        self._category_cache: dict[int, int] = {}
+        # guild_id -> (welcome template, time cached)
+        self._welcome_cache: dict[int, tuple[str | None, float]] = {}
         self.sync_channels_task.start()
 
+    async def _get_welcome_template(self, guild_id: int) -> str | None:
+        """Get a guild's welcome template, served from memory while fresh."""
+        cached = self._welcome_cache.get(guild_id)
+        if cached and time.monotonic() - cached[1] < _WELCOME_CACHE_TTL:
+            return cached[0]
+        template = await get_welcome_message(guild_id)
+        self._welcome_cache[guild_id] = (template, time.monotonic())
+        return template
+
+    async def _get_personal_category(self, guild: discord.Guild) -> discord.CategoryChannel:
+        """Get the "Personal Channels" category for a guild, creating it if needed."""
+        cached_id = self._category_cache.get(guild.id)
+        if cached_id:
+            category = guild.get_channel(cached_id)
+            if isinstance(category, discord.CategoryChannel) and category.name == "Personal Channels":
+                return category
+
+        category = discord.utils.get(guild.categories, name="Personal Channels")
+        if not category:
+            category = await guild.create_category("Personal Channels")
+        self._category_cache[guild.id] = category.id
+        return category
+
+    @commands.Cog.listener()
+    async def on_guild_channel_delete(self, channel: discord.abc.GuildChannel):
+        """Drop the cached category if it was deleted."""
+        if self._category_cache.get(channel.guild.id) == channel.id:
+            self._category_cache.pop(channel.guild.id, None)
+
     def cog_unload(self):
         self.sync_channels_task.cancel()
 
     @tasks.loop(hours=1)
     async def sync_channels_task(self):
         """Periodically sync channels: create missing ones and fix permissions."""
-        for guild in self.bot.guilds:
-            try:
-                await self._ensure_all_members_have_channels(guild)
-                await self._sync_guild_channel_permissions(guild)
-            except Exception as e:
-                logging.error(f"Error syncing channels for guild {guild.id}: {e}")
+        # Guilds sync concurrently, bounded so we don't trip Discord's global rate limit
+        sem = asyncio.Semaphore(4)
+
+        async def _sync_guild(guild: discord.Guild):
+            async with sem:
+                try:
+                    await self._ensure_all_members_have_channels(guild)
+                    await self._sync_guild_channel_permissions(guild)
+                except Exception as e:
+                    logging.error(f"Error syncing channels for guild {guild.id}: {e}")
+
+        await asyncio.gather(*(_sync_guild(guild) for guild in self.bot.guilds))
 
     @sync_channels_task.before_loop
     async def before_sync_channels_task(self):
@@ -377,13 +452,11 @@ class ChannelManagement(commands.Cog):
         users_with_channels = {uc["user_id"] for uc in user_channels}
 
         # Find or create the category
-        category = discord.utils.get(guild.categories, name="Personal Channels")
-        if not category:
-            try:
-                category = await guild.create_category("Personal Channels")
-            except discord.Forbidden:
-                logging.error(f"Missing permissions to create category in guild {guild.id}")
-                return 0
+        try:
+            category = await self._get_personal_category(guild)
+        except discord.Forbidden:
+            logging.error(f"Missing permissions to create category in guild {guild.id}")
+            return 0
 
         created = 0
         for member in guild.members:
@@ -410,13 +483,13 @@ class ChannelManagement(commands.Cog):
                 )
 
                 # Send welcome message if configured
-                welcome_template = await get_welcome_message(guild.id)
+                welcome_template = await self._get_welcome_template(guild.id)
                 if welcome_template:
-                    welcome_msg = welcome_template.replace("{name}", member.mention).replace("{channel}", channel.mention)
+                    welcome_msg = _render_welcome(welcome_template, member.mention, channel.mention)
                     await channel.send(welcome_msg)
 
                 created += 1
-                logging.info(f"Created channel {channel.name} for {member} in {guild.name}")
+                logging.info(f"Created channel {channel.name} for {member.name} in {guild.name}")
 
             except discord.Forbidden:
                 logging.error(f"Missing permissions to create channel for {member.id} in guild {guild.id}")
@@ -428,6 +501,8 @@ class ChannelManagement(commands.Cog):
     async def _sync_guild_channel_permissions(self, guild: discord.Guild):
         """Sync permissions for all personal channels in a guild."""
         user_channels = await get_all_user_channels(guild.id)
+        stale_ids = []
+        to_fix = []
         for mapping in user_channels:
             user_id = mapping["user_id"]
             channel_id = mapping["channel_id"]
@@ -435,7 +510,7 @@ class ChannelManagement(commands.Cog):
             channel = guild.get_channel(channel_id)
             if not channel:
                 # Channel was deleted, clean up DB record
-                await delete_user_channel(guild.id, user_id)
+                stale_ids.append(channel_id)
                 continue
 
             member = guild.get_member(user_id)
@@ -444,16 +519,26 @@ class ChannelManagement(commands.Cog):
                 continue
 
             # Check if user already has manage_permissions
-            overwrites = channel.overwrites_for(member)
-            if overwrites.manage_permissions is not True:
+            ow = channel.overwrites.get(member)
+            if ow is None or ow.manage_permissions is not True:
+                to_fix.append((channel, member))
+
+        await delete_user_channels_bulk(guild.id, stale_ids)
+
+        sem = asyncio.Semaphore(5)
+
+        async def _fix(channel: discord.TextChannel, member: discord.Member):
+            async with sem:
                 try:
                     await _set_channel_owner_permissions(channel, member)
-                    logging.info(f"Synced permissions for {member} on channel {channel.name}")
+                    logging.info(f"Synced permissions for {member.name} on channel {channel.name}")
                 except discord.Forbidden:
                     logging.error(f"Missing permissions to set channel perms for {member.id} in {guild.id}")
                 except discord.HTTPException as e:
                     logging.error(f"Failed to set channel perms for {member.id} in {guild.id}: {e}")
 
+        await asyncio.gather(*(_fix(channel, member) for channel, member in to_fix))
+
     @channels.command(description="[Admin] Sync permissions for all personal channels")
     @discord.default_permissions(administrator=True)
     async def sync_permissions(self, ctx):
@@ -493,7 +578,8 @@ class ChannelManagement(commands.Cog):
 
     @channels.command(description="[Admin] Discover and link unlinked personal channels")
     @discord.default_permissions(administrator=True)
-    async def discover(self, ctx):
+    @option("limit", description="Max channels and members to consider (default: 200)", required=False, min_value=1, max_value=1000)
+    async def discover(self, ctx, limit: int = 200):
         """Find channels in Personal Channels category that aren't linked to users and try to match them using Claude AI."""
         guild = ctx.guild
         if not guild:
@@ -519,8 +605,18 @@ class ChannelManagement(commands.Cog):
             await ctx.respond("All channels in Personal Channels are already linked.", ephemeral=True)
             return
 
-        # Get members without channels
-        available_members = [m for m in guild.members if not m.bot and m.id not in users_with_channels]
+        if len(unlinked) > limit:
+            await ctx.respond(
+                f"Found {len(unlinked)} unlinked channels, which is more than the limit of {limit}. "
+                "Run again with a higher `limit`.",
+                ephemeral=True
+            )
+            return
+
+        # Get members without channels (capped so the prompt stays bounded in large guilds)
+        available_members = list(itertools.islice(
+            (m for m in guild.members if not m.bot and m.id not in users_with_channels), limit
+        ))
 
         if not available_members:
             await ctx.respond(f"Found {len(unlinked)} unlinked channels but all members already have channels assigned.", ephemeral=True)
@@ -534,8 +630,8 @@ class ChannelManagement(commands.Cog):
             return
 
         # Build the prompt
-        channels_list = "\n".join([f"- {ch.name}" for ch in unlinked])
-        members_list = "\n".join([f"- {m.display_name} (username: {m.name})" for m in available_members])
+        channels_list = "\n".join(f"- {ch.name}" for ch in unlinked)
+        members_list = "\n".join(f"- {m.display_name} (username: {m.name})" for m in available_members)
 
         prompt = f"""Match these Discord channel names to member names. Channels are typically named after the person who owns them (with spaces replaced by hyphens).
 
@@ -553,7 +649,7 @@ Only include matches you're reasonably confident about. Use "high" for exact/obv
 Return valid JSON only, no explanation."""
 
         try:
-            response = client.messages.create(
+            response = await client.messages.create(
                 max_tokens=2000,
                 messages=[{"role": "user", "content": prompt}],
                 model="claude-sonnet-4-5",
@@ -561,13 +657,11 @@ Return valid JSON only, no explanation."""
             response_text = response.content[0].text.strip()
 
             # Parse JSON response
-            import json
             # Handle markdown code blocks
-            if response_text.startswith("```"):
-                response_text = response_text.split("```")[1]
-                if response_text.startswith("json"):
-                    response_text = response_text[4:]
-            matches_data = json.loads(response_text)
+            fence_match = _CODEFENCE_RE.match(response_text)
+            if fence_match:
+                response_text = fence_match.group(1)
+            matches_data = _json_loads(response_text)
 
         except Exception as e:
             logging.error(f"Claude matching failed: {e}")
@@ -600,13 +694,16 @@ Return valid JSON only, no explanation."""
             conf_emoji = "✓" if conf == "high" else "?"
             lines.append(f"{conf_emoji} {ch.mention} → {member.mention}")
 
-        unmatched_channels = [ch for ch in unlinked if ch not in [m[0] for m in matched]]
-        if unmatched_channels:
-            lines.append(f"\n**{len(unmatched_channels)} channels couldn't be matched:**")
-            for ch in unmatched_channels[:5]:
+        matched_set = {m[0] for m in matched}
+        unmatched_iter = (ch for ch in unlinked if ch not in matched_set)
+        preview = list(itertools.islice(unmatched_iter, 5))
+        if preview:
+            remaining = sum(1 for _ in unmatched_iter)
+            lines.append(f"\n**{len(preview) + remaining} channels couldn't be matched:**")
+            for ch in preview:
                 lines.append(f"• {ch.mention}")
-            if len(unmatched_channels) > 5:
-                lines.append(f"• ... and {len(unmatched_channels) - 5} more")
+            if remaining:
+                lines.append(f"• ... and {remaining} more")
 
         # Create confirmation view with buttons
         view = DiscoverConfirmView(matched, guild, ctx.author.id)
@@ -627,20 +724,25 @@ class DiscoverConfirmView(discord.ui.View):
             return
 
         await interaction.response.defer()
-        linked_count = 0
-        for channel, member, _ in self.matched:
-            try:
-                await _set_channel_owner_permissions(channel, member)
-                await create_user_channel(
-                    guild_id=self.guild.id,
-                    user_id=member.id,
-                    channel_id=channel.id,
-                    username=str(member),
-                    guild_name=self.guild.name
-                )
-                linked_count += 1
-            except Exception as e:
-                logging.error(f"Failed to link {channel.name} to {member}: {e}")
+        sem = asyncio.Semaphore(5)
+
+        async def _link(channel: discord.TextChannel, member: discord.Member) -> dict | None:
+            async with sem:
+                try:
+                    await _set_channel_owner_permissions(channel, member)
+                    return {"user_id": member.id, "channel_id": channel.id, "username": str(member)}
+                except Exception as e:
+                    logging.error(f"Failed to link {channel.name} to {member.name}: {e}")
+                    return None
+
+        results = await asyncio.gather(*(_link(channel, member) for channel, member, _ in self.matched))
+        rows = [row for row in results if row]
+        try:
+            await create_user_channels_bulk(self.guild.id, rows, self.guild.name)
+            linked_count = len(rows)
+        except Exception as e:
+            logging.error(f"Failed to store linked channels in guild {self.guild.id}: {e}")
+            linked_count = 0
 
         self.disable_all_items()
         await interaction.edit_original_response(content=f"Linked {linked_count} channels.", view=self)
@@ -6,20 +6,21 @@ from discord.ext import commands
 from discord import option
 import os
 import logging
-from anthropic import Anthropic
+from anthropic import AsyncAnthropic
 
 # Initialize client lazily to avoid errors if API key not set
 _client = None
 
 
-def get_client() -> Anthropic | None:
-    """Get or create Anthropic client."""
+def get_client() -> AsyncAnthropic | None:
+    """Get or create the shared async Anthropic client.
+    Reusing one client keeps its connection pool, so calls skip the TLS handshake to the API."""
     global _client
     if _client is None:
         api_key = os.environ.get("ANTHROPIC_API_KEY")
         if not api_key:
             return None
-        _client = Anthropic(api_key=api_key)
+        _client = AsyncAnthropic(api_key=api_key)
     return _client
 
 
@@ -80,7 +81,7 @@ Please provide a helpful response based on the conversation context if relevant.
 
             # Call Claude API
             # ~900 tokens ≈ 3600 chars, leaving room within Discord's 4000 char bot limit
-            response = client.messages.create(
+            response = await client.messages.create(
                 max_tokens=900,
                 messages=[{"role": "user", "content": full_prompt}],
                 model="claude-sonnet-4-5",
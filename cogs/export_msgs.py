@@ -1,14 +1,61 @@
 # ABOUTME: Provides /export-msgs command to export channel messages from a time window as a text file.
 # ABOUTME: Parses duration strings like "2h", "3d" and uploads a formatted .txt file to the channel.
 
+import asyncio
 import discord
 from discord.ext import commands
 from discord import option
 import logging
-import io
+import tempfile
 from datetime import datetime, timedelta, timezone
 from cogs.reminders import parse_time_interval
 
+# Messages formatted per worker-thread hop
+_FORMAT_BATCH = 500
+
+
+def _stamp(dt: datetime) -> str:
+    """Format a datetime as YYYYMMDD-HHMM for filenames."""
+    return f"{dt.year:04d}{dt.month:02d}{dt.day:02d}-{dt.hour:02d}{dt.minute:02d}"
+
+
+_TS_FMT = "%Y-%m-%d %H:%M:%S UTC"
+
+
+def _write_message(write, msg: discord.Message):
+    """Write one message as `[timestamp] author: content` via a bound write method."""
+    content, attachments, embeds = msg.content, msg.attachments, msg.embeds
+    write(f"[{msg.created_at.strftime(_TS_FMT)}] {msg.author.display_name}: ".encode())
+
+    wrote_part = False
+    if content:
+        write(content.encode())
+        wrote_part = True
+    for a in attachments:
+        if wrote_part:
+            write(b"\n")
+        write(f"[attachment: {a.filename} {a.url}]".encode())
+        wrote_part = True
+    for e in embeds:
+        title, description = e.title, e.description
+        if title or description:
+            if wrote_part:
+                write(b"\n")
+            write(f"[embed: {title or ''} - {description or ''}]".encode())
+            wrote_part = True
+    if not wrote_part:
+        write(b"[no content]")
+
+
+def _write_messages(out, messages: list[discord.Message], first: bool):
+    """Write a batch of messages separated by blank lines."""
+    write = out.write
+    for msg in messages:
+        if not first:
+            write(b"\n\n")
+        _write_message(write, msg)
+        first = False
+
 
 class ExportMessages(commands.Cog):
     def __init__(self, bot):
@@ -27,54 +74,47 @@ class ExportMessages(commands.Cog):
 
         await ctx.defer(ephemeral=True)
 
-        after = datetime.now(timezone.utc) - delta
-
-        try:
-            messages = []
-            async for message in ctx.channel.history(after=after, oldest_first=True, limit=None):
-                messages.append(message)
-        except discord.Forbidden:
-            await ctx.followup.send("I don't have permission to read this channel's history.", ephemeral=True)
-            return
-
-        if not messages:
-            await ctx.followup.send(f"No messages found in the last `{duration}`.", ephemeral=True)
-            return
-
-        # Format messages
-        lines = []
-        for msg in messages:
-            ts = msg.created_at.strftime("%Y-%m-%d %H:%M:%S UTC")
-            author = msg.author.display_name
-
-            content_parts = []
-            if msg.content:
-                content_parts.append(msg.content)
-            if msg.attachments:
-                for a in msg.attachments:
-                    content_parts.append(f"[attachment: {a.filename} {a.url}]")
-            if msg.embeds:
-                for e in msg.embeds:
-                    if e.title or e.description:
-                        content_parts.append(f"[embed: {e.title or ''} - {e.description or ''}]")
-
-            content = "\n".join(content_parts) if content_parts else "[no content]"
-            lines.append(f"[{ts}] {author}: {content}")
-
-        text = "\n\n".join(lines)
-
-        # Build filename
-        channel_name = getattr(ctx.channel, "name", "channel")
-        start_str = after.strftime("%Y%m%d-%H%M")
-        end_str = datetime.now(timezone.utc).strftime("%Y%m%d-%H%M")
-        filename = f"{channel_name}_{start_str}_to_{end_str}.txt"
-
-        file = discord.File(io.BytesIO(text.encode()), filename=filename)
-        await ctx.followup.send(
-            f"Exported **{len(messages)}** messages from the last `{duration}`.",
-            file=file,
-            ephemeral=True,
-        )
+        now = datetime.now(timezone.utc)
+        after = now - delta
+
+        # Format messages in fixed-size batches on a worker thread so memory stays
+        # bounded and the event loop is free for heartbeats; small exports stay in
+        # memory, large ones spill to disk
+        with tempfile.SpooledTemporaryFile(max_size=8 << 20, mode="w+b") as spool:
+            count = 0
+            batch = []
+            try:
+                async for message in ctx.channel.history(after=after, oldest_first=True, limit=None):
+                    batch.append(message)
+                    if len(batch) >= _FORMAT_BATCH:
+                        await asyncio.to_thread(_write_messages, spool, batch, count == 0)
+                        count += len(batch)
+                        batch = []
+            except discord.Forbidden:
+                await ctx.followup.send("I don't have permission to read this channel's history.", ephemeral=True)
+                return
+
+            if batch:
+                await asyncio.to_thread(_write_messages, spool, batch, count == 0)
+                count += len(batch)
+
+            if not count:
+                await ctx.followup.send(f"No messages found in the last `{duration}`.", ephemeral=True)
+                return
+            spool.seek(0)
+
+            # Build filename
+            channel_name = getattr(ctx.channel, "name", "channel")
+            start_str = _stamp(after)
+            end_str = _stamp(now)
+            filename = f"{channel_name}_{start_str}_to_{end_str}.txt"
+
+            file = discord.File(spool, filename=filename)
+            await ctx.followup.send(
+                f"Exported **{count}** messages from the last `{duration}`.",
+                file=file,
+                ephemeral=True,
+            )
 
 
 def setup(bot):
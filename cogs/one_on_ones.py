@@ -4,41 +4,136 @@
 import discord
 from discord.ext import commands, tasks
 from discord import option, SlashCommandGroup
+import asyncio
+import functools
 import logging
 import random
-from datetime import datetime, timedelta, timezone
+import time
+from datetime import datetime, timedelta, timezone, time as dtime
 
 from db.actions import (
     join_one_on_one_pool,
     leave_one_on_one_pool,
     get_one_on_one_pool_status,
     set_one_on_one_skip,
-    get_available_pool_members,
     mark_user_sat_out,
     get_users_who_sat_out_recently,
+    get_unmatched_available_members,
     create_one_on_one_match,
+    bulk_create_one_on_one_matches,
     get_match_by_thread,
-    get_match_by_id,
-    update_match_status,
-    complete_match,
+    confirm_match,
+    decline_match,
     increment_match_reminder,
     get_matches_needing_reminder,
     get_user_match_history,
-    get_users_matched_this_week,
-    get_user_partners_this_week,
 )
 
+# Reactions accepted on legacy match threads
+_CONFIRM_DECLINE = frozenset(("\u2705", "\u274c"))
 
-def get_week_start() -> str:
+_HOW_IT_WORKS = (
+    "**How it works:**\n"
+    "- Find a time to chat (voice call, coffee, whatever works)\n"
+    "- Click \u2705 when you've scheduled/completed your 1-1\n"
+    "- Click \u274c if you can't make it this week\n\n"
+    "Have a great conversation!"
+)
+
+_PAIR_MSG_TEMPLATE = (
+    "Hey <@{u1}> and <@{u2}>! You've been matched for a 1-1 this week.\n\n"
+    + _HOW_IT_WORKS
+)
+
+_REMATCH_MSG_TEMPLATE = (
+    "Hey <@{u1}> and <@{u2}>! You've been matched for a 1-1 this week.\n\n"
+    "(This is a rematch after the original pairing didn't work out.)\n\n"
+    + _HOW_IT_WORKS
+)
+
+
+def get_week_start(now: datetime | None = None) -> str:
     """Get the ISO date string for the start of the current week (Monday)."""
-    today = datetime.now(timezone.utc).date()
+    today = (now or datetime.now(timezone.utc)).date()
     monday = today - timedelta(days=today.weekday())
     return monday.isoformat()
 
 
+def _guild_only(func):
+    """Reply with an error instead of running the command outside a server."""
+    @functools.wraps(func)
+    async def wrapper(self, ctx: discord.ApplicationContext, *args, **kwargs):
+        if not ctx.guild:
+            await ctx.respond("This command can only be used in a server.", ephemeral=True)
+            return
+        return await func(self, ctx, *args, **kwargs)
+    return wrapper
+
+
+class OneOnOneView(discord.ui.View):
+    """Persistent confirm/decline buttons posted in each match thread."""
+
+    def __init__(self, cog: "OneOnOnes"):
+        super().__init__(timeout=None)
+        self.cog = cog
+
+    async def _get_match_for(self, interaction: discord.Interaction) -> dict | None:
+        """Look up the thread's match and make sure the clicker is one of the pair."""
+        match = await get_match_by_thread(interaction.channel_id)
+        if not match:
+            await interaction.response.send_message("This 1-1 is no longer active.", ephemeral=True)
+            return None
+        if interaction.user.id not in (match["user1_id"], match["user2_id"]):
+            await interaction.response.send_message("Only the matched members can respond to this 1-1.", ephemeral=True)
+            return None
+        if match["completed_at"]:
+            await interaction.response.send_message("This 1-1 has already been decided.", ephemeral=True)
+            return None
+        return match
+
+    async def _finish(self, interaction: discord.Interaction, decided: bool | None):
+        """Tell a late clicker the match was decided, and grey out the buttons once it is."""
+        if decided is None:
+            await interaction.followup.send("This 1-1 has already been decided.", ephemeral=True)
+        elif not decided:
+            return
+        view = OneOnOneView(self.cog)
+        for item in view.children:
+            item.disabled = True
+        try:
+            await interaction.message.edit(view=view)
+        except Exception as e:
+            logging.error(f"Error disabling 1-1 buttons: {e}")
+
+    @discord.ui.button(emoji="\u2705", style=discord.ButtonStyle.grey, custom_id="oneonone:confirm")
+    async def confirm(self, button: discord.ui.Button, interaction: discord.Interaction):
+        match = await self._get_match_for(interaction)
+        if not match:
+            return
+        await interaction.response.defer()
+        decided = await self.cog._handle_confirm(interaction.channel_id, interaction.user.id, match)
+        await self._finish(interaction, decided)
+
+    @discord.ui.button(emoji="\u274c", style=discord.ButtonStyle.grey, custom_id="oneonone:decline")
+    async def decline(self, button: discord.ui.Button, interaction: discord.Interaction):
+        match = await self._get_match_for(interaction)
+        if not match:
+            return
+        await interaction.response.defer()
+        decided = await self.cog._handle_decline(
+            interaction.guild_id, interaction.channel_id, interaction.user.id, match
+        )
+        await self._finish(interaction, decided)
+
+
 class OneOnOnes(commands.Cog):
     def __init__(self, bot):
         self.bot = bot
+        # guild_id -> #1-1s channel id
+        self._oneonone_channel_cache: dict[int, int] = {}
+        self._bot_user_id = bot.user.id if bot.user else None
+        # Re-attach button handlers to match messages posted before a restart
+        self.bot.add_view(OneOnOneView(self))
         self.weekly_matching.start()
         self.send_reminders.start()
 
@@ -49,11 +144,8 @@ class OneOnOnes(commands.Cog):
     one_on_ones = SlashCommandGroup("1-1s", "Weekly 1-1 matching commands")
 
     @one_on_ones.command(name="join", description="Join the weekly 1-1 matching pool")
+    @_guild_only
     async def join(self, ctx: discord.ApplicationContext):
-        if not ctx.guild:
-            await ctx.respond("This command can only be used in a server.", ephemeral=True)
-            return
-
         joined = await join_one_on_one_pool(ctx.guild.id, ctx.author.id)
         if joined:
             await ctx.respond(
@@ -64,11 +156,8 @@ class OneOnOnes(commands.Cog):
             await ctx.respond("You're already in the 1-1 matching pool.", ephemeral=True)
 
     @one_on_ones.command(name="leave", description="Leave the weekly 1-1 matching pool")
+    @_guild_only
     async def leave(self, ctx: discord.ApplicationContext):
-        if not ctx.guild:
-            await ctx.respond("This command can only be used in a server.", ephemeral=True)
-            return
-
         left = await leave_one_on_one_pool(ctx.guild.id, ctx.author.id)
         if left:
             await ctx.respond("You've left the 1-1 matching pool.", ephemeral=True)
@@ -76,11 +165,8 @@ class OneOnOnes(commands.Cog):
             await ctx.respond("You're not in the 1-1 matching pool.", ephemeral=True)
 
     @one_on_ones.command(name="status", description="Check your 1-1 matching pool status")
+    @_guild_only
     async def status(self, ctx: discord.ApplicationContext):
-        if not ctx.guild:
-            await ctx.respond("This command can only be used in a server.", ephemeral=True)
-            return
-
         status = await get_one_on_one_pool_status(ctx.guild.id, ctx.author.id)
         if not status:
             await ctx.respond(
@@ -93,9 +179,9 @@ class OneOnOnes(commands.Cog):
         lines.append(f"Joined: {status['joined_at'][:10]}")
 
         if status["skip_until"]:
-            skip_date = datetime.fromisoformat(status["skip_until"])
+            skip_date = datetime.fromtimestamp(status["skip_until"], timezone.utc)
             if skip_date > datetime.now(timezone.utc):
-                lines.append(f"Skipping until: {status['skip_until'][:10]}")
+                lines.append(f"Skipping until: {skip_date.date().isoformat()}")
             else:
                 lines.append("Not skipping any weeks")
         else:
@@ -105,11 +191,8 @@ class OneOnOnes(commands.Cog):
 
     @one_on_ones.command(name="skip", description="Skip 1-1 matching for a number of weeks")
     @option("weeks", description="Number of weeks to skip (1-8)", min_value=1, max_value=8)
+    @_guild_only
     async def skip(self, ctx: discord.ApplicationContext, weeks: int):
-        if not ctx.guild:
-            await ctx.respond("This command can only be used in a server.", ephemeral=True)
-            return
-
         status = await get_one_on_one_pool_status(ctx.guild.id, ctx.author.id)
         if not status:
             await ctx.respond(
@@ -119,18 +202,15 @@ class OneOnOnes(commands.Cog):
             return
 
         skip_until = datetime.now(timezone.utc) + timedelta(weeks=weeks)
-        await set_one_on_one_skip(ctx.guild.id, ctx.author.id, skip_until.isoformat())
+        await set_one_on_one_skip(ctx.guild.id, ctx.author.id, int(skip_until.timestamp()))
         await ctx.respond(
             f"You'll skip matching for {weeks} week(s), until {skip_until.strftime('%B %d, %Y')}.",
             ephemeral=True
         )
 
     @one_on_ones.command(name="history", description="View your past 1-1 matches")
+    @_guild_only
     async def history(self, ctx: discord.ApplicationContext):
-        if not ctx.guild:
-            await ctx.respond("This command can only be used in a server.", ephemeral=True)
-            return
-
         matches = await get_user_match_history(ctx.guild.id, ctx.author.id, limit=10)
         if not matches:
             await ctx.respond("You don't have any past 1-1 matches.", ephemeral=True)
@@ -147,35 +227,50 @@ class OneOnOnes(commands.Cog):
 
     @one_on_ones.command(name="run_matching", description="[Admin] Manually trigger weekly matching")
     @commands.has_permissions(administrator=True)
+    @_guild_only
     async def run_matching(self, ctx: discord.ApplicationContext):
-        if not ctx.guild:
-            await ctx.respond("This command can only be used in a server.", ephemeral=True)
-            return
-
         await ctx.defer(ephemeral=True)
         count = await self._run_matching_for_guild(ctx.guild)
         await ctx.respond(f"Matching complete! Created {count} match(es).", ephemeral=True)
 
     async def _get_one_on_ones_channel(self, guild: discord.Guild) -> discord.TextChannel | None:
         """Find the #1-1s channel in a guild."""
+        cid = self._oneonone_channel_cache.get(guild.id)
+        if cid:
+            channel = guild.get_channel(cid)
+            if channel and channel.name == "1-1s":
+                return channel
+
         for channel in guild.text_channels:
             if channel.name == "1-1s":
+                self._oneonone_channel_cache[guild.id] = channel.id
                 return channel
         return None
 
+    @commands.Cog.listener()
+    async def on_guild_channel_create(self, channel: discord.abc.GuildChannel):
+        """A new #1-1s channel may take over from the cached one."""
+        if channel.name == "1-1s":
+            self._oneonone_channel_cache.pop(channel.guild.id, None)
+
+    @commands.Cog.listener()
+    async def on_guild_channel_update(self, before: discord.abc.GuildChannel, after: discord.abc.GuildChannel):
+        """Drop the cached #1-1s channel when a channel is renamed to or from it."""
+        if before.name != after.name and "1-1s" in (before.name, after.name):
+            self._oneonone_channel_cache.pop(after.guild.id, None)
+
+    @commands.Cog.listener()
+    async def on_guild_channel_delete(self, channel: discord.abc.GuildChannel):
+        """Drop the cached #1-1s channel if it was deleted."""
+        if self._oneonone_channel_cache.get(channel.guild.id) == channel.id:
+            self._oneonone_channel_cache.pop(channel.guild.id, None)
+
     async def _run_matching_for_guild(self, guild: discord.Guild) -> int:
         """Run the matching algorithm for a guild. Returns number of matches created."""
         week_start = get_week_start()
 
-        # Get available members (not skipping)
-        available = await get_available_pool_members(guild.id, week_start)
-        if len(available) < 2:
-            return 0
-
-        # Filter out those already matched this week
-        already_matched = await get_users_matched_this_week(guild.id, week_start)
-        available = [u for u in available if u not in already_matched]
-
+        # Get available members (not skipping, not already matched this week)
+        available = await get_unmatched_available_members(guild.id, week_start)
         if len(available) < 2:
             return 0
 
@@ -183,22 +278,32 @@ class OneOnOnes(commands.Cog):
         sit_out_user = None
         if len(available) % 2 == 1:
             # Get users who sat out in the last 4 weeks
-            four_weeks_ago = (datetime.now(timezone.utc) - timedelta(weeks=4)).isoformat()
+            four_weeks_ago = int(time.time()) - 4 * 7 * 86400
             recently_sat_out = set(await get_users_who_sat_out_recently(guild.id, four_weeks_ago))
 
-            # Prefer to sit out someone who hasn't sat out recently
-            candidates = [u for u in available if u not in recently_sat_out]
-            if candidates:
-                sit_out_user = random.choice(candidates)
-            else:
-                sit_out_user = random.choice(available)
-
-            available.remove(sit_out_user)
+            # Prefer to sit out someone who hasn't sat out recently; single-pass
+            # reservoir sample so no candidate list is built
+            seen = 0
+            idx = None
+            for i, u in enumerate(available):
+                if u in recently_sat_out:
+                    continue
+                seen += 1
+                if random.random() * seen < 1:
+                    idx = i
+            if idx is None:
+                idx = random.randrange(len(available))
+
+            # Swap-remove; order doesn't matter since the list is shuffled next
+            sit_out_user = available[idx]
+            available[idx] = available[-1]
+            available.pop()
             await mark_user_sat_out(guild.id, sit_out_user)
 
         # Shuffle and pair
         random.shuffle(available)
-        pairs = [(available[i], available[i + 1]) for i in range(0, len(available), 2)]
+        it = iter(available)
+        pairs = zip(it, it)
 
         # Find the #1-1s channel
         channel = await self._get_one_on_ones_channel(guild)
@@ -206,44 +311,54 @@ class OneOnOnes(commands.Cog):
             logging.warning(f"No #1-1s channel found in guild {guild.id}")
             return 0
 
-        matches_created = 0
-        for user1_id, user2_id in pairs:
-            try:
-                thread = await channel.create_thread(
-                    name=f"1-1: Week of {week_start}",
-                    type=discord.ChannelType.public_thread,
-                    auto_archive_duration=10080  # 7 days
-                )
-
-                # Post instructions
-                message = (
-                    f"Hey <@{user1_id}> and <@{user2_id}>! You've been matched for a 1-1 this week.\n\n"
-                    "**How it works:**\n"
-                    "- Find a time to chat (voice call, coffee, whatever works)\n"
-                    "- React with :white_check_mark: when you've scheduled/completed your 1-1\n"
-                    "- React with :x: if you can't make it this week\n\n"
-                    "Have a great conversation!"
-                )
-                msg = await thread.send(message)
-                await msg.add_reaction("\u2705")  # white_check_mark
-                await msg.add_reaction("\u274c")  # x
+        # Create all pair threads concurrently; each pair handles its own errors
+        results = await asyncio.gather(
+            *(self._create_pair_thread(channel, guild, week_start, u1, u2) for u1, u2 in pairs),
+            return_exceptions=True
+        )
+        rows = []
+        for (u1, u2), result in zip(pairs, results):
+            if isinstance(result, BaseException):
+                logging.error(f"Error creating 1-1 thread for {u1} and {u2} in guild {guild.id}: {result}")
+            elif isinstance(result, dict):
+                rows.append(result)
+        await bulk_create_one_on_one_matches(rows)
+        return len(rows)
+
+    async def _create_pair_thread(self, channel: discord.TextChannel, guild: discord.Guild, week_start: str,
+                                  user1_id: int, user2_id: int) -> dict | None:
+        """Create the thread for one pair. Returns the match row to store, or None on failure."""
+        try:
+            thread = await channel.create_thread(
+                name=f"1-1: Week of {week_start}",
+                type=discord.ChannelType.public_thread,
+                auto_archive_duration=10080  # 7 days
+            )
 
-                await create_one_on_one_match(guild.id, week_start, user1_id, user2_id, thread.id)
-                matches_created += 1
+            # Post instructions
+            message = _PAIR_MSG_TEMPLATE.format(u1=user1_id, u2=user2_id)
+            await thread.send(message, view=OneOnOneView(self))
 
-            except discord.Forbidden:
-                logging.error(f"Missing permissions to create thread in guild {guild.id}")
-            except discord.HTTPException as e:
-                logging.error(f"Failed to create match thread: {e}")
+            return {
+                "guild_id": guild.id,
+                "week_start": week_start,
+                "user1_id": user1_id,
+                "user2_id": user2_id,
+                "thread_id": thread.id,
+            }
 
-        return matches_created
+        except discord.Forbidden:
+            logging.error(f"Missing permissions to create thread in guild {guild.id}")
+        except discord.HTTPException as e:
+            logging.error(f"Failed to create match thread: {e}")
+        return None
 
-    @tasks.loop(hours=1)
+    @tasks.loop(time=dtime(hour=10, tzinfo=timezone.utc))
     async def weekly_matching(self):
         """Run matching every Sunday at 10am UTC."""
         now = datetime.now(timezone.utc)
-        # Sunday = 6, 10am = hour 10
-        if now.weekday() != 6 or now.hour != 10:
+        # Fires daily at 10am; Sunday = 6
+        if now.weekday() != 6:
             return
 
         for guild in self.bot.guilds:
@@ -256,7 +371,7 @@ class OneOnOnes(commands.Cog):
     async def before_weekly_matching(self):
         await self.bot.wait_until_ready()
 
-    @tasks.loop(hours=12)
+    @tasks.loop(time=dtime(hour=9, tzinfo=timezone.utc))
     async def send_reminders(self):
         """Send reminders for matches that haven't been confirmed."""
         now = datetime.now(timezone.utc)
@@ -264,13 +379,17 @@ class OneOnOnes(commands.Cog):
         if now.weekday() not in (1, 3):
             return
 
-        week_start = get_week_start()
+        week_start = get_week_start(now)
 
         for guild in self.bot.guilds:
             try:
                 matches = await get_matches_needing_reminder(guild.id, week_start, max_reminders=2)
+                if not matches:
+                    continue
+                # One API call for every active thread instead of a fetch per reminder
+                active = {t.id: t for t in await guild.active_threads()}
                 for match in matches:
-                    await self._send_reminder(guild, match)
+                    await self._send_reminder(guild, match, active)
             except Exception as e:
                 logging.error(f"Error sending reminders for guild {guild.id}: {e}")
 
@@ -278,14 +397,14 @@ class OneOnOnes(commands.Cog):
     async def before_send_reminders(self):
         await self.bot.wait_until_ready()
 
-    async def _send_reminder(self, guild: discord.Guild, match: dict):
+    async def _send_reminder(self, guild: discord.Guild, match: dict, active: dict[int, discord.Thread]):
         """Send a reminder in the match thread."""
-        thread_id = match.get("thread_id")
+        thread_id = match["thread_id"]
         if not thread_id:
             return
 
         try:
-            thread = guild.get_thread(thread_id)
+            thread = active.get(thread_id) or guild.get_thread(thread_id)
             if not thread:
                 thread = await self.bot.fetch_channel(thread_id)
 
@@ -298,7 +417,7 @@ class OneOnOnes(commands.Cog):
             if pending_users:
                 await thread.send(
                     f"Friendly reminder! {' and '.join(pending_users)} - have you had a chance to "
-                    "schedule your 1-1? React with :white_check_mark: when done!"
+                    "schedule your 1-1? Click \u2705 when done!"
                 )
                 await increment_match_reminder(match["id"])
 
@@ -309,79 +428,87 @@ class OneOnOnes(commands.Cog):
         except Exception as e:
             logging.error(f"Error sending reminder: {e}")
 
+    @commands.Cog.listener()
+    async def on_ready(self):
+        self._bot_user_id = self.bot.user.id
+
     @commands.Cog.listener()
     async def on_raw_reaction_add(self, payload: discord.RawReactionActionEvent):
-        """Handle reactions in match threads."""
-        if payload.user_id == self.bot.user.id:
+        """Handle reactions in match threads posted before the buttons existed."""
+        if payload.user_id == self._bot_user_id:
             return
 
-        if str(payload.emoji) not in ("\u2705", "\u274c"):
+        emoji = str(payload.emoji)
+        if emoji not in _CONFIRM_DECLINE:
+            return
+
+        # Match threads are the only place these reactions matter; skip the DB otherwise
+        if not isinstance(self.bot.get_channel(payload.channel_id), discord.Thread):
             return
 
         match = await get_match_by_thread(payload.channel_id)
         if not match:
             return
 
-        if payload.user_id not in (match["user1_id"], match["user2_id"]):
+        if payload.user_id not in (match["user1_id"], match["user2_id"]) or match["completed_at"]:
             return
 
-        if str(payload.emoji) == "\u2705":
-            await self._handle_confirm(payload, match)
-        elif str(payload.emoji) == "\u274c":
-            await self._handle_decline(payload, match)
+        if emoji == "\u2705":
+            await self._handle_confirm(payload.channel_id, payload.user_id, match)
+        else:
+            await self._handle_decline(payload.guild_id, payload.channel_id, payload.user_id, match)
 
-    async def _handle_confirm(self, payload: discord.RawReactionActionEvent, match: dict):
-        """Handle a user confirming their 1-1."""
-        await update_match_status(match["id"], payload.user_id, "confirmed")
+    async def _handle_confirm(self, channel_id: int, user_id: int, match: dict) -> bool | None:
+        """Handle a user confirming their 1-1.
+        Returns True if this completed the match, False if the partner hasn't confirmed yet,
+        or None if the match had already been decided."""
+        updated_match = await confirm_match(match["id"], user_id)
+        if updated_match is None:
+            return None
 
-        # Check if both users have confirmed
-        updated_match = await get_match_by_id(match["id"])
-        if updated_match["user1_status"] == "confirmed" and updated_match["user2_status"] == "confirmed":
-            await complete_match(match["id"])
+        # completed_at is only set once both users have confirmed
+        if not updated_match["completed_at"]:
+            return False
 
-            try:
-                channel = self.bot.get_channel(payload.channel_id)
-                if channel:
-                    await channel.send("Both of you have confirmed - nice work! This 1-1 is complete.")
-            except Exception as e:
-                logging.error(f"Error sending completion message: {e}")
+        try:
+            channel = self.bot.get_channel(channel_id)
+            if channel:
+                await channel.send("Both of you have confirmed - nice work! This 1-1 is complete.")
+        except Exception as e:
+            logging.error(f"Error sending completion message: {e}")
+        return True
 
-    async def _handle_decline(self, payload: discord.RawReactionActionEvent, match: dict):
-        """Handle a user declining their 1-1."""
-        await update_match_status(match["id"], payload.user_id, "declined")
-        await complete_match(match["id"])
+    async def _handle_decline(self, guild_id: int, channel_id: int, user_id: int, match: dict) -> bool | None:
+        """Handle a user declining their 1-1.
+        Returns True once declined, or None if the match had already been decided."""
+        # Only the click that actually flips the match announces it and rematches
+        if not await decline_match(match["id"], user_id):
+            return None
 
         # Find the partner
-        partner_id = match["user2_id"] if payload.user_id == match["user1_id"] else match["user1_id"]
+        partner_id = match["user2_id"] if user_id == match["user1_id"] else match["user1_id"]
 
         try:
-            channel = self.bot.get_channel(payload.channel_id)
+            channel = self.bot.get_channel(channel_id)
             if channel:
                 await channel.send(
-                    f"<@{payload.user_id}> can't make it this week. Looking for a new match for <@{partner_id}>..."
+                    f"<@{user_id}> can't make it this week. Looking for a new match for <@{partner_id}>..."
                 )
         except Exception as e:
             logging.error(f"Error sending decline message: {e}")
 
         # Try to find a new match for the partner
-        await self._attempt_rematch(payload.guild_id, partner_id)
+        await self._attempt_rematch(guild_id, partner_id)
+        return True
 
     async def _attempt_rematch(self, guild_id: int, user_id: int):
         """Try to find a new match for a user whose partner declined."""
         week_start = get_week_start()
 
-        # Get available pool members
-        available = await get_available_pool_members(guild_id, week_start)
-
-        # Get who this user has already been paired with
-        already_partnered = await get_user_partners_this_week(guild_id, user_id, week_start)
-        already_matched = await get_users_matched_this_week(guild_id, week_start)
-
-        # Find candidates: in pool, not skipping, not already matched, not already partnered with this user
-        candidates = [
-            u for u in available
-            if u != user_id and u not in already_partnered and u not in already_matched
-        ]
+        # Find candidates: in pool, not skipping, not already matched this week.
+        # Anyone this user was partnered with this week is matched, so they're excluded too.
+        available = await get_unmatched_available_members(guild_id, week_start)
+        candidates = list(set(available) - {user_id})
 
         if not candidates:
             # DM the user that no match was found
@@ -413,18 +540,8 @@ class OneOnOnes(commands.Cog):
                 auto_archive_duration=10080
             )
 
-            message = (
-                f"Hey <@{user_id}> and <@{new_partner_id}>! You've been matched for a 1-1 this week.\n\n"
-                "(This is a rematch after the original pairing didn't work out.)\n\n"
-                "**How it works:**\n"
-                "- Find a time to chat (voice call, coffee, whatever works)\n"
-                "- React with :white_check_mark: when you've scheduled/completed your 1-1\n"
-                "- React with :x: if you can't make it this week\n\n"
-                "Have a great conversation!"
-            )
-            msg = await thread.send(message)
-            await msg.add_reaction("\u2705")
-            await msg.add_reaction("\u274c")
+            message = _REMATCH_MSG_TEMPLATE.format(u1=user_id, u2=new_partner_id)
+            await thread.send(message, view=OneOnOneView(self))
 
             await create_one_on_one_match(guild_id, week_start, user_id, new_partner_id, thread.id)
 
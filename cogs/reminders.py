@@ -7,7 +7,7 @@ from discord import option
 import logging
 import re
 from datetime import datetime, timedelta, timezone
-from db.actions import create_reminder, get_due_reminders, mark_reminder_completed
+from db.actions import create_reminder, get_due_reminder_ids, claim_reminder, release_reminder
 
 
 def parse_time_interval(time_str: str) -> timedelta | None:
@@ -72,11 +72,19 @@ class Reminders(commands.Cog):
     async def check_reminders(self):
         """Check for due reminders and send them."""
         try:
-            due_reminders = await get_due_reminders()
-            for reminder in due_reminders:
-                await self._send_reminder(reminder)
+            due_ids = await get_due_reminder_ids()
         except Exception as e:
             logging.error(f"Error checking reminders: {str(e)}")
+            return
+        # Claim each reminder just before sending it, so a crash or error part way through
+        # leaves the rest unclaimed for the next check
+        for reminder_id in due_ids:
+            try:
+                reminder = await claim_reminder(reminder_id)
+                if reminder:
+                    await self._send_reminder(reminder)
+            except Exception as e:
+                logging.error(f"Error sending reminder {reminder_id}: {str(e)}")
 
     @check_reminders.before_loop
     async def before_check_reminders(self):
@@ -84,7 +92,7 @@ class Reminders(commands.Cog):
         await self.bot.wait_until_ready()
 
     async def _send_reminder(self, reminder):
-        """Send a single reminder and mark it as completed."""
+        """Send a single claimed reminder; on a transient failure release it for a retry."""
         reminder_id = reminder["id"]
         guild_id = reminder["guild_id"]
         user_id = reminder["user_id"]
@@ -96,13 +104,11 @@ class Reminders(commands.Cog):
             guild = self.bot.get_guild(guild_id)
             if not guild:
                 logging.warning(f"Guild {guild_id} not found for reminder {reminder_id}")
-                await mark_reminder_completed(reminder_id)
                 return
 
             channel = guild.get_channel(channel_id)
             if not channel:
                 logging.warning(f"Channel {channel_id} not found for reminder {reminder_id}")
-                await mark_reminder_completed(reminder_id)
                 return
 
             # Build reminder message
@@ -114,16 +120,16 @@ class Reminders(commands.Cog):
             content += f"[Original message]({message_link})"
 
             await channel.send(content)
-            await mark_reminder_completed(reminder_id)
 
         except discord.Forbidden:
             logging.error(f"Missing permissions to send reminder {reminder_id} in channel {channel_id}")
-            await mark_reminder_completed(reminder_id)
         except discord.HTTPException as e:
             logging.error(f"Failed to send reminder {reminder_id}: {str(e)}")
-            # Don't mark as completed - will retry next cycle
+            # Hand it back - will retry next cycle
+            await release_reminder(reminder_id)
         except Exception as e:
             logging.error(f"Unexpected error sending reminder {reminder_id}: {str(e)}")
+            await release_reminder(reminder_id)
 
     @discord.slash_command(name="remindme", description="Set a reminder for a message")
     @option("message_link", description="Link to the message (right-click -> Copy Message Link)")
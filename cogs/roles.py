@@ -1,14 +1,84 @@
 import discord
 from discord.ext import commands, tasks
 from discord import option
+import asyncio
 import logging
+import random
+import time
 from datetime import datetime, timedelta, timezone
-from db.actions import get_active_role_id, set_active_role_id, get_all_user_channels, get_active_days, set_active_days
+from db.actions import (
+    get_active_role_id,
+    set_active_role_id,
+    get_user_channel_map,
+    get_all_channel_owners,
+    get_active_days,
+    set_active_days,
+    get_all_last_posts,
+    save_last_posts,
+    bulk_set_defaults,
+    get_all_active_role_ids,
+)
+
+
+# guild_id -> in-flight lookup/creation, so concurrent callers share one result
+_role_inflight: dict[int, asyncio.Future] = {}
+
+# guild_id -> configured active role id, loaded once on startup and kept in sync on changes
+_role_id_cache: dict[int, int] = {}
+
+# Strong references to fire-and-forget tasks so they aren't garbage collected mid-run
+_background_tasks: set[asyncio.Task] = set()
+
+
+def _spawn(coro) -> asyncio.Task:
+    task = asyncio.create_task(coro)
+    _background_tasks.add(task)
+    task.add_done_callback(_background_tasks.discard)
+    return task
+
+
+async def load_active_role_ids():
+    """Fill the role id cache from the database in one query."""
+    _role_id_cache.update(await get_all_active_role_ids())
+
+
+def cache_active_role_id(guild_id: int, role_id: int):
+    _role_id_cache[guild_id] = role_id
 
 
 async def get_or_create_active_role(guild: discord.Guild) -> discord.Role | None:
     """Get the active journaling role for a guild, creating it if it doesn't exist.
+    _role_id_cache is the only in-memory record of the role id, so every caller sees a recreated role.
     Returns None if unable to get or create the role."""
+    role_id = _role_id_cache.get(guild.id)
+    if role_id is not None:
+        if role := guild.get_role(role_id):
+            return role
+        # Role was deleted; forget it so it gets recreated
+        _role_id_cache.pop(guild.id, None)
+
+    if pending := _role_inflight.get(guild.id):
+        return await pending
+
+    future = asyncio.get_running_loop().create_future()
+    _role_inflight[guild.id] = future
+    try:
+        role = await _get_or_create_active_role(guild)
+        future.set_result(role)
+        return role
+    except Exception as e:
+        future.set_exception(e)
+        # Don't warn about an unretrieved exception when nobody else was waiting
+        future.exception()
+        raise
+    finally:
+        if not future.done():
+            future.cancel()
+        _role_inflight.pop(guild.id, None)
+
+
+async def _get_or_create_active_role(guild: discord.Guild) -> discord.Role | None:
+    """Look up the configured role, creating and storing a new one if it's missing."""
     role_id = await get_active_role_id(guild.id)
     role = None
 
@@ -25,111 +95,368 @@ async def get_or_create_active_role(guild: discord.Guild) -> discord.Role | None
                 reason="Created by bot for active journaling members"
             )
             await set_active_role_id(guild.id, role.id, guild.name)
-            logging.info(f"Created Active Journaling role in guild {guild.id}")
+            logging.info("Created Active Journaling role in guild %s", guild.id)
         except discord.Forbidden:
-            logging.error(f"Missing permissions to create role in guild {guild.id}")
+            logging.error("Missing permissions to create role in guild %s", guild.id)
             return None
         except discord.HTTPException as e:
-            logging.error(f"Failed to create role in guild {guild.id}: {str(e)}")
+            logging.error("Failed to create role in guild %s: %s", guild.id, e)
             return None
 
+    _role_id_cache[guild.id] = role.id
     return role
 
 
-async def get_last_message_time(channel: discord.TextChannel, user_id: int) -> datetime | None:
-    """Get the timestamp of the user's most recent message in the channel."""
+async def get_last_message_id(channel: discord.TextChannel, user_id: int) -> int | None:
+    """Get the id of the user's most recent message in the channel.
+    Reads small pages first, doubling the page size, for at most 3 pages."""
+    before = None
     try:
-        async for message in channel.history(limit=100):
-            if message.author.id == user_id:
-                return message.created_at
+        for page_size in (20, 40, 80):
+            oldest = None
+            async for message in channel.history(limit=page_size, before=before):
+                if message.author.id == user_id:
+                    return message.id
+                oldest = message
+            if oldest is None:
+                break
+            before = oldest
     except discord.Forbidden:
-        logging.error(f"Missing permissions to read history in channel {channel.id}")
+        logging.error("Missing permissions to read history in channel %s", channel.id)
     except discord.HTTPException as e:
-        logging.error(f"Failed to read channel history {channel.id}: {e}")
+        logging.error("Failed to read channel history %s: %s", channel.id, e)
     return None
 
 
+async def _with_retry(coro_factory, tries: int = 3):
+    """Await coro_factory(), retrying rate limits (honouring Retry-After) and 5xx errors
+    with exponential backoff. Other HTTP errors are raised immediately."""
+    for attempt in range(tries):
+        try:
+            return await coro_factory()
+        except discord.HTTPException as e:
+            if attempt == tries - 1 or not (e.status == 429 or e.status >= 500):
+                raise
+            if e.status == 429:
+                delay = float(e.response.headers.get("Retry-After", 1))
+            else:
+                delay = min(2 ** attempt, 30)
+            await asyncio.sleep(delay)
+
+
+async def set_member_role(member: discord.Member, role: discord.Role, present: bool, reason: str):
+    """Add or remove a role with a single PATCH of the member's full role set.
+    Each retry rebuilds the set from the member's current roles."""
+    def _edit():
+        # member._roles is the raw id list (no @everyone); avoids building Role objects
+        roles = [discord.Object(id=rid) for rid in member._roles if rid != role.id]
+        if present:
+            roles.append(role)
+        return member.edit(roles=roles, reason=reason)
+
+    await _with_retry(_edit)
+
+
+# How long the active_days setting is reused before re-reading
+_SETTINGS_CACHE_TTL = 5 * 60
+
+# Seconds between active role sweeps of each guild
+_SWEEP_INTERVAL = 60 * 60
+
+
 class RoleManagement(commands.Cog):
     def __init__(self, bot):
         self.bot = bot
-        self.update_active_roles.start()
+        # (channel_id, user_id) -> id of that user's latest message in the channel (ids are
+        # snowflakes, so they order by time); None means a history scan found no recent message
+        self.last_post: dict[tuple[int, int], int | None] = {}
+        # last_post keys restored from the database; the user may have posted while the bot
+        # was down, so these are only a lower bound until checked against the channel
+        self._restored: set[tuple[int, int]] = set()
+        # guild_id -> (time fetched, active_days); the role id lives only in _role_id_cache
+        self._settings_cache: dict[int, tuple[float, int]] = {}
+        # Personal channel id -> owner id, loaded on startup and refreshed by each sweep
+        self._channel_owner: dict[int, int] = {}
+        # (guild_id, user_id) -> timer that re-checks the member once their activity lapses
+        self._expiry: dict[tuple[int, int], asyncio.TimerHandle] = {}
+        # Personal-channel posts not yet written to the database
+        self._unsaved_posts: dict[tuple[int, int], int] = {}
+        # guild_id -> that guild's sweep loop
+        self._guild_tasks: dict[int, asyncio.Task] = {}
+        self._startup = asyncio.create_task(self._start_guild_loops())
+        self.save_last_posts_task.start()
 
     def cog_unload(self):
-        self.update_active_roles.cancel()
+        self._startup.cancel()
+        for task in self._guild_tasks.values():
+            task.cancel()
+        self._guild_tasks.clear()
+        self.save_last_posts_task.cancel()
+        if self._unsaved_posts:
+            _spawn(self._save_last_posts())
+        for handle in self._expiry.values():
+            handle.cancel()
+        self._expiry.clear()
+
+    async def _start_guild_loops(self):
+        """Wait until the bot is ready, restore channel owners and saved last-post times, then start sweeping."""
+        await self.bot.wait_until_ready()
+        try:
+            self._channel_owner.update(await get_all_channel_owners())
+            for key, posted_at in (await get_all_last_posts()).items():
+                if key not in self.last_post:
+                    self.last_post[key] = discord.utils.time_snowflake(datetime.fromtimestamp(posted_at, timezone.utc))
+                    self._restored.add(key)
+        except Exception as e:
+            logging.error("Error loading saved last posts: %s", e)
+
+        try:
+            await bulk_set_defaults([{"guild_id": g.id, "name": g.name} for g in self.bot.guilds])
+            await load_active_role_ids()
+        except Exception as e:
+            logging.error("Error seeding guild settings: %s", e)
 
-    @tasks.loop(hours=1)
-    async def update_active_roles(self):
-        """Periodically check and update active journaling roles for all guilds."""
         for guild in self.bot.guilds:
+            self._start_guild_loop(guild.id)
+
+    def _start_guild_loop(self, guild_id: int):
+        if guild_id not in self._guild_tasks:
+            self._guild_tasks[guild_id] = asyncio.create_task(self._guild_loop(guild_id))
+
+    async def _guild_loop(self, guild_id: int):
+        """Sweep one guild's active roles every interval, starting at a random offset so
+        guilds don't all hit the API at once. Lapses are mostly handled by per-member
+        expiry timers; this is the safety net."""
+        await asyncio.sleep(random.uniform(0, _SWEEP_INTERVAL))
+        while guild := self.bot.get_guild(guild_id):
             try:
                 await self._update_guild_active_roles(guild)
             except Exception as e:
-                logging.error(f"Error updating active roles for guild {guild.id}: {str(e)}")
-
-    @update_active_roles.before_loop
-    async def before_update_active_roles(self):
-        """Wait until the bot is ready before starting the loop."""
-        await self.bot.wait_until_ready()
+                logging.error("Error updating active roles for guild %s: %s", guild_id, e)
+            await asyncio.sleep(_SWEEP_INTERVAL)
+        self._guild_tasks.pop(guild_id, None)
+
+    @commands.Cog.listener()
+    async def on_guild_join(self, guild: discord.Guild):
+        self._start_guild_loop(guild.id)
+
+    @commands.Cog.listener()
+    async def on_guild_available(self, guild: discord.Guild):
+        # A guild's loop exits while it's unavailable; resume it after an outage
+        self._start_guild_loop(guild.id)
+
+    @commands.Cog.listener()
+    async def on_guild_remove(self, guild: discord.Guild):
+        if task := self._guild_tasks.pop(guild.id, None):
+            task.cancel()
+
+    @tasks.loop(seconds=1)
+    async def save_last_posts_task(self):
+        """Write buffered personal-channel posts in one batch instead of once per message."""
+        if self._unsaved_posts:
+            await self._save_last_posts()
+
+    async def _save_last_posts(self):
+        pending, self._unsaved_posts = self._unsaved_posts, {}
+        try:
+            await save_last_posts([
+                {"channel_id": cid, "user_id": uid, "posted_at": discord.utils.snowflake_time(mid).timestamp()}
+                for (cid, uid), mid in pending.items()
+            ])
+        except Exception as e:
+            logging.error("Error saving last posts: %s", e)
 
-    async def _update_guild_active_roles(self, guild: discord.Guild, notify: bool = True):
+    @commands.Cog.listener()
+    async def on_message(self, message: discord.Message):
+        if not message.guild or message.author.bot:
+            return
+        # Only posts in the author's own personal channel are ever read back
+        if self._channel_owner.get(message.channel.id) != message.author.id:
+            return
+        post_key = (message.channel.id, message.author.id)
+        self.last_post[post_key] = message.id
+        self._restored.discard(post_key)
+        self._unsaved_posts[post_key] = message.id
+
+        # The XP cog grants the role on a personal-channel post; schedule its removal
+        # for when this post falls out of the active window, pushing back on each post
+        active_days = await self._get_active_days(message.guild.id)
+        key = (message.guild.id, message.author.id)
+        if handle := self._expiry.pop(key, None):
+            handle.cancel()
+        self._expiry[key] = asyncio.get_running_loop().call_later(
+            active_days * 86400 + 1, self._schedule_expiry_check, *key, message.channel.id
+        )
+
+    def _schedule_expiry_check(self, guild_id: int, user_id: int, channel_id: int):
+        self._expiry.pop((guild_id, user_id), None)
+        _spawn(self._expiry_check(guild_id, user_id, channel_id))
+
+    async def _expiry_check(self, guild_id: int, user_id: int, channel_id: int):
+        """Re-evaluate one member's role after their last post has aged out."""
+        guild = self.bot.get_guild(guild_id)
+        member = guild and guild.get_member(user_id)
+        if not member:
+            return
+        try:
+            active_days = await self._get_active_days(guild_id)
+            role = await get_or_create_active_role(guild)
+            if role:
+                cutoff = discord.utils.time_snowflake(datetime.now(timezone.utc) - timedelta(days=active_days))
+                holders = {user_id} if role.id in member._roles else set()
+                notifications = []
+                await self._process_member(member, role, {user_id: channel_id},
+                                           {channel_id: guild.get_channel(channel_id)}, holders, cutoff,
+                                           active_days, notifications)
+                for m, channel in notifications:
+                    await self._notify_role_removed(m, channel, active_days)
+        except Exception as e:
+            logging.error("Error expiring active role for %s in guild %s: %s", user_id, guild_id, e)
+
+    async def _get_last_post(self, channel: discord.TextChannel, user_id: int) -> int | None:
+        """Latest message id for a user in a channel, scanning history the first time. A value
+        restored from the database is rescanned once if the channel has newer messages."""
+        key = (channel.id, user_id)
+        if key in self._restored:
+            self._restored.discard(key)
+            known = self.last_post[key]
+            if (channel.last_message_id or 0) > known:
+                found = await get_last_message_id(channel, user_id)
+                if found is not None and found > known:
+                    self.last_post[key] = self._unsaved_posts[key] = found
+            return self.last_post[key]
+        if key not in self.last_post:
+            self.last_post[key] = await get_last_message_id(channel, user_id)
+            if self.last_post[key] is not None:
+                self._unsaved_posts[key] = self.last_post[key]
+        return self.last_post[key]
+
+    async def _get_active_days(self, guild_id: int, force_refresh: bool = False) -> int:
+        """Return a guild's active_days setting, cached for a few minutes."""
+        cached = self._settings_cache.get(guild_id)
+        if cached and not force_refresh and time.monotonic() - cached[0] < _SETTINGS_CACHE_TTL:
+            return cached[1]
+        active_days = await get_active_days(guild_id)
+        self._settings_cache[guild_id] = (time.monotonic(), active_days)
+        return active_days
+
+    async def _update_guild_active_roles(self, guild: discord.Guild, notify: bool = True,
+                                         force_refresh: bool = False):
         """Update active roles for a specific guild based on actual channel activity."""
+        # Get settings
+        active_days = await self._get_active_days(guild.id, force_refresh)
+
         # Get or create the active role
         role = await get_or_create_active_role(guild)
         if not role:
             return
 
-        # Get settings
-        active_days = await get_active_days(guild.id)
-        cutoff = datetime.now(timezone.utc) - timedelta(days=active_days)
+        # Every edit would 403 if the bot can't manage this role; check once instead of per member
+        me = guild.me
+        if not (me.guild_permissions.manage_roles and role < me.top_role):
+            logging.error("Missing permissions to manage the active role in guild %s", guild.id)
+            return
+
+        # Cutoff as a snowflake so activity checks are plain integer comparisons on message ids
+        cutoff = discord.utils.time_snowflake(datetime.now(timezone.utc) - timedelta(days=active_days))
 
         # Get all user channels
-        user_channels = await get_all_user_channels(guild.id)
-        channel_map = {uc["user_id"]: uc["channel_id"] for uc in user_channels}
-
-        # Check each member
-        for member in guild.members:
-            if member.bot:
-                continue
-
-            has_role = role in member.roles
-            channel_id = channel_map.get(member.id)
-
-            # If no personal channel, they shouldn't have the role
-            if not channel_id:
-                if has_role:
-                    try:
-                        await member.remove_roles(role, reason="No personal channel assigned")
-                    except (discord.Forbidden, discord.HTTPException) as e:
-                        logging.error(f"Failed to remove role from {member.id}: {e}")
-                continue
-
-            channel = guild.get_channel(channel_id)
-            if not channel:
-                # Channel was deleted
-                if has_role:
-                    try:
-                        await member.remove_roles(role, reason="Personal channel deleted")
-                    except (discord.Forbidden, discord.HTTPException) as e:
-                        logging.error(f"Failed to remove role from {member.id}: {e}")
-                continue
-
-            # Check last message time
-            last_msg_time = await get_last_message_time(channel, member.id)
-            is_active = last_msg_time is not None and last_msg_time > cutoff
+        channel_map = await get_user_channel_map(guild.id)
+        self._channel_owner.update((cid, uid) for uid, cid in channel_map.items())
+        channels_by_id = {cid: guild.get_channel(cid) for cid in set(channel_map.values())}
+
+        # Check members concurrently, bounded to stay inside the member-edit rate limit
+        sem = asyncio.Semaphore(8)
+
+        async def _bounded(member: discord.Member):
+            async with sem:
+                await self._process_member(member, role, channel_map, channels_by_id, role_member_ids, cutoff,
+                                           active_days, notifications)
+
+        # role.members walks the whole guild, so read it once
+        role_members = role.members
+        role_member_ids = {m.id for m in role_members}
+
+        # Only members with a personal channel, or holding the role without one, can need changes
+        members = [m for m in map(guild.get_member, channel_map) if m and not m.bot]
+        members.extend(m for m in role_members if m.id not in channel_map and not m.bot)
+
+        # Role changes first; DMs are best-effort and shouldn't hold up the next member's update
+        notifications = [] if notify else None
+        results = await asyncio.gather(*(_bounded(m) for m in members), return_exceptions=True)
+        for member, result in zip(members, results):
+            if isinstance(result, BaseException):
+                logging.error("Error updating active role for %s in guild %s: %s", member.id, guild.id, result)
+        if notifications:
+            results = await asyncio.gather(
+                *(self._notify_role_removed(m, channel, active_days) for m, channel in notifications),
+                return_exceptions=True
+            )
+            for (member, _), result in zip(notifications, results):
+                if isinstance(result, BaseException):
+                    logging.error("Error notifying %s about role removal: %s", member.id, result)
+
+    async def _process_member(self, member: discord.Member, role: discord.Role, channel_map: dict[int, int],
+                              channels_by_id: dict[int, discord.TextChannel | None],
+                              role_member_ids: set[int], cutoff: int, active_days: int,
+                              notifications: list[tuple[discord.Member, discord.TextChannel]] | None):
+        """Add or remove the active role for one member based on their channel activity.
+        role_member_ids holds the ids of members with the role and is kept in sync with changes.
+        Members who lose the role for inactivity are appended to notifications, if given."""
+        guild = member.guild
+        has_role = member.id in role_member_ids
+        channel_id = channel_map.get(member.id)
+
+        # If no personal channel, they shouldn't have the role
+        if not channel_id:
+            if has_role:
+                try:
+                    await set_member_role(member, role, False, "No personal channel assigned")
+                    role_member_ids.discard(member.id)
+                except (discord.Forbidden, discord.HTTPException) as e:
+                    logging.error("Failed to remove role from %s: %s", member.id, e)
+            return
 
-            try:
-                if is_active and not has_role:
-                    # Add role
-                    await member.add_roles(role, reason=f"Active journaling in last {active_days} days")
-                elif not is_active and has_role:
-                    # Remove role and notify
-                    await member.remove_roles(role, reason=f"No journaling in last {active_days} days")
-                    if notify:
-                        await self._notify_role_removed(member, channel, active_days)
-            except discord.Forbidden:
-                logging.error(f"Missing permissions to manage roles for user {member.id} in guild {guild.id}")
-            except discord.HTTPException as e:
-                logging.error(f"Failed to update role for user {member.id} in guild {guild.id}: {str(e)}")
+        channel = channels_by_id.get(channel_id)
+        if not channel:
+            # Channel was deleted
+            if has_role:
+                try:
+                    await set_member_role(member, role, False, "Personal channel deleted")
+                    role_member_ids.discard(member.id)
+                except (discord.Forbidden, discord.HTTPException) as e:
+                    logging.error("Failed to remove role from %s: %s", member.id, e)
+            return
+
+        # cutoff is a snowflake, so message ids compare against it directly. If even the
+        # channel's newest message is older than the cutoff the member can't be active.
+        # The newest message may be someone else's, so only the member's own known post
+        # lets a current holder skip the check
+        last_id = channel.last_message_id
+        if last_id is None or last_id <= cutoff:
+            is_active = False
+        else:
+            known = self.last_post.get((channel.id, member.id))
+            if has_role and known is not None and known > cutoff:
+                return
+            last_msg_id = await self._get_last_post(channel, member.id)
+            is_active = last_msg_id is not None and last_msg_id > cutoff
+
+        try:
+            if is_active and not has_role:
+                # Add role
+                await set_member_role(member, role, True, f"Active journaling in last {active_days} days")
+                role_member_ids.add(member.id)
+            elif not is_active and has_role:
+                # Remove role and notify
+                await set_member_role(member, role, False, f"No journaling in last {active_days} days")
+                role_member_ids.discard(member.id)
+                if notifications is not None:
+                    notifications.append((member, channel))
+        except discord.Forbidden:
+            logging.error("Missing permissions to manage roles for user %s in guild %s", member.id, guild.id)
+        except discord.HTTPException as e:
+            logging.error("Failed to update role for user %s in guild %s: %s", member.id, guild.id, e)
 
     async def _notify_role_removed(self, member: discord.Member, channel: discord.TextChannel, days: int):
         """Notify a user that their active journaling role was removed."""
@@ -149,7 +476,7 @@ class RoleManagement(commands.Cog):
             except (discord.Forbidden, discord.HTTPException):
                 pass
         except discord.HTTPException as e:
-            logging.error(f"Failed to notify user {member.id} about role removal: {e}")
+            logging.error("Failed to notify user %s about role removal: %s", member.id, e)
 
     roles = discord.SlashCommandGroup("roles", "Role management")
 
@@ -164,10 +491,10 @@ class RoleManagement(commands.Cog):
         await ctx.defer(ephemeral=True)
 
         try:
-            await self._update_guild_active_roles(guild, notify=False)
+            await self._update_guild_active_roles(guild, notify=False, force_refresh=True)
             await ctx.followup.send("Active roles updated successfully!", ephemeral=True)
         except Exception as e:
-            logging.error(f"Error manually updating active roles for guild {guild.id}: {str(e)}")
+            logging.error("Error manually updating active roles for guild %s: %s", guild.id, e)
             await ctx.followup.send("An error occurred while updating roles.", ephemeral=True)
 
     @roles.command(description="[Admin] Set which role to use for active journaling")
@@ -181,9 +508,10 @@ class RoleManagement(commands.Cog):
 
         try:
             await set_active_role_id(guild.id, role.id, guild.name)
+            cache_active_role_id(guild.id, role.id)
             await ctx.respond(f"Active journaling role set to {role.mention}", ephemeral=True)
         except Exception as e:
-            logging.error(f"Error setting active role for guild {guild.id}: {str(e)}")
+            logging.error("Error setting active role for guild %s: %s", guild.id, e)
             await ctx.respond("An error occurred while setting the role.", ephemeral=True)
 
     @roles.command(description="[Admin] Set how many days of inactivity before losing the role")
@@ -197,9 +525,10 @@ class RoleManagement(commands.Cog):
 
         try:
             await set_active_days(guild.id, days, guild.name)
+            self._settings_cache.pop(guild.id, None)
             await ctx.respond(f"Users will lose Active Journaling role after {days} days of inactivity.", ephemeral=True)
         except Exception as e:
-            logging.error(f"Error setting active days for guild {guild.id}: {str(e)}")
+            logging.error("Error setting active days for guild %s: %s", guild.id, e)
             await ctx.respond("An error occurred while setting active days.", ephemeral=True)
 
 
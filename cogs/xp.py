@@ -1,13 +1,57 @@
+import asyncio
 import discord
-from discord.ext import commands
+from discord.ext import commands, tasks
+import logging
 import random
 from db.connection import database
-from db.actions import can_award_xp, award_xp, get_user_xp, get_user_channel
+from db.actions import try_award_xp, get_user_xp, get_user_channel, reconcile_user_xp, flush_message_logs, prune_message_logs
+
+# Strong reference to the final flush so it isn't garbage collected after the cog is gone
+_background_tasks: set[asyncio.Task] = set()
 
 
 class XP(commands.Cog):
     def __init__(self, bot):
         self.bot = bot
+        # Cutoff of the previous reconcile; None makes the first run cover everyone
+        self._xp_aged_since = None
+        self.reconcile_xp.start()
+        self.flush_logs.start()
+        self.prune_logs.start()
+
+    def cog_unload(self):
+        self.reconcile_xp.cancel()
+        self.flush_logs.cancel()
+        self.prune_logs.cancel()
+        task = asyncio.create_task(flush_message_logs())
+        _background_tasks.add(task)
+        task.add_done_callback(_background_tasks.discard)
+
+    @tasks.loop(seconds=1)
+    async def flush_logs(self):
+        """Write message logs buffered by award_xp in one batch."""
+        try:
+            await flush_message_logs()
+        except Exception as e:
+            logging.error(f"Error flushing message logs: {e}")
+
+    @tasks.loop(hours=1)
+    async def prune_logs(self):
+        """Delete message logs too old to count towards any XP window."""
+        try:
+            deleted = await prune_message_logs()
+            if deleted:
+                logging.info(f"Pruned {deleted} old message logs")
+        except Exception as e:
+            logging.error(f"Error pruning message logs: {e}")
+
+    @tasks.loop(minutes=1)
+    async def reconcile_xp(self):
+        """Drop XP from messages that have aged out of the rolling 3-day window."""
+        try:
+            self._xp_aged_since = await reconcile_user_xp(self._xp_aged_since)
+        except Exception as e:
+            logging.error(f"Error reconciling XP totals: {e}")
     
     @commands.Cog.listener()
     async def on_message(self, message: discord.Message):
@@ -26,26 +70,19 @@ class XP(commands.Cog):
         guild_name = message.guild.name
         message_content = message.content
         
-        # Calculate XP based on rules
-        xp_to_award = 0.0
-        
         # Rule 1: For at most one message per minute, get random XP between 6 and 10
-        if await can_award_xp(guild_id, user_id):
-            base_xp = random.uniform(6, 10)
-            xp_to_award += base_xp
-        
+        base_xp = random.uniform(6, 10)
+
         # Rule 2: For each character above 50, get 0.1 XP
-        message_length = len(message_content)
-        if message_length > 50:
-            extra_chars = message_length - 50
-            length_xp = extra_chars * 0.1
-            xp_to_award += length_xp
-        
-        # Award the XP (will be rounded to 3 decimal places in the function)
-        await award_xp(
+        length_xp = max(len(message_content) - 50, 0) * 0.1
+
+        # Log the message and award XP in one call; base XP is only credited if the
+        # rate limit allows (XP will be rounded to 3 decimal places in the function)
+        await try_award_xp(
             guild_id=guild_id,
             user_id=user_id,
-            xp_amount=xp_to_award,
+            base_xp=base_xp,
+            extra_xp=length_xp,
             username=username,
             guild_name=guild_name
         )
@@ -54,7 +91,6 @@ class XP(commands.Cog):
         personal_channel_id = await get_user_channel(guild_id, user_id)
         if personal_channel_id and message.channel.id == personal_channel_id:
             from cogs.roles import get_or_create_active_role
-            import logging
             role = await get_or_create_active_role(message.guild)
             if role and role not in message.author.roles:
                 try:
@@ -1,62 +1,114 @@
-from sqlalchemy import create_engine
-from datetime import datetime, timedelta
+from sqlalchemy import case, create_engine, func, select
+from sqlalchemy.dialects import sqlite
+from sqlalchemy.dialects.sqlite import insert as sqlite_insert
+import asyncio
+import logging
+import os
+import time
+from datetime import datetime, timezone
+from databases.interfaces import Record
 from db.connection import database, DATABASE_URL
-from db.schema import users, guilds, user_private_channels, user_xp, message_logs, guild_settings, reminders, one_on_one_pool, one_on_one_matches, user_ai_config, user_ai_wakeups, channel_messages, metadata
+from db.schema import users, guilds, user_private_channels, user_xp, message_logs, guild_settings, reminders, one_on_one_pool, one_on_one_matches, user_ai_config, user_ai_wakeups, channel_messages, user_last_posts, metadata
+
+
+# Development aid: with DB_EXPLAIN set, hot queries log their plan once if it scans a whole table
+_EXPLAIN = bool(os.getenv("DB_EXPLAIN"))
+_explained: set[str] = set()
+
+
+async def _explain_once(query, values: dict | None = None):
+    """Run EXPLAIN QUERY PLAN for a query the first time it is seen and warn about full table scans."""
+    if isinstance(query, str):
+        sql = query
+    else:
+        # Inline the parameters; the sqlite dialect would otherwise render qmark placeholders
+        sql, values = str(query.compile(dialect=sqlite.dialect(), compile_kwargs={"literal_binds": True})), None
+    if sql in _explained:
+        return
+    _explained.add(sql)
+    try:
+        plan = await database.fetch_all(f"EXPLAIN QUERY PLAN {sql}", values or {})
+    except Exception as e:
+        logging.warning(f"EXPLAIN QUERY PLAN failed for {sql!r}: {e}")
+        return
+    scans = [row[3] for row in plan if row[3].startswith("SCAN") and "INDEX" not in row[3]]
+    if scans:
+        logging.warning(f"Full table scan in query {sql!r}: {'; '.join(scans)}")
 
 
 async def get_user_channel(guild_id: int, user_id: int):
     """Check if a user already has a personal channel in a guild.
     Returns the channel_id if found, None otherwise."""
-    query = user_private_channels.select().where(
+    query = select(user_private_channels.c.channel_id).where(
         (user_private_channels.c.guild_id == guild_id) &
         (user_private_channels.c.user_id == user_id)
     )
-    result = await database.fetch_one(query)
-    return result["channel_id"] if result else None
+    return await database.fetch_val(query)
+
+
+# Time spans in epoch seconds
+_DAY = 86400
+_RATE_LIMIT = 60
+_XP_WINDOW = 3 * _DAY
+
+# Per-message queries are kept as plain SQL so they skip SQLAlchemy compilation on every call
+_ENSURE_USER_SQL = "INSERT INTO users (user_id, username) VALUES (:user_id, :username) ON CONFLICT DO NOTHING"
+_ENSURE_GUILD_SQL = "INSERT INTO guilds (guild_id, name) VALUES (:guild_id, :name) ON CONFLICT DO NOTHING"
+_LAST_LOG_SQL = "SELECT MAX(timestamp) FROM message_logs WHERE guild_id = :guild_id AND user_id = :user_id"
+_ADD_USER_XP_SQL = (
+    "INSERT INTO user_xp (guild_id, user_id, xp, updated_at) VALUES (:guild_id, :user_id, :xp, :updated_at)"
+    " ON CONFLICT (guild_id, user_id) DO UPDATE"
+    " SET xp = user_xp.xp + excluded.xp, updated_at = excluded.updated_at"
+)
+_USER_XP_SQL = "SELECT xp FROM user_xp WHERE guild_id = :guild_id AND user_id = :user_id"
+_DUE_REMINDER_IDS_SQL = "SELECT id FROM reminders WHERE remind_at <= :now AND completed = 0"
+_CLAIM_REMINDER_SQL = "UPDATE reminders SET completed = 1 WHERE id = :id AND completed = 0 RETURNING *"
+
+
+async def _ensure_user_and_guild(user_id: int, guild_id: int, username: str = None, guild_name: str = None):
+    """Insert the user and guild records if they don't exist yet; existing rows are left as-is."""
+    await database.execute(_ENSURE_USER_SQL, {"user_id": user_id, "username": username})
+    await database.execute(_ENSURE_GUILD_SQL, {"guild_id": guild_id, "name": guild_name})
 
 
 async def create_user_channel(guild_id: int, user_id: int, channel_id: int, username: str = None, guild_name: str = None):
     """Create or update a user_private_channel record.
     Also ensures the user and guild records exist."""
-    # Ensure user exists
-    user_query = users.select().where(users.c.user_id == user_id)
-    user_exists = await database.fetch_one(user_query)
-    if not user_exists:
+    upsert = sqlite_insert(user_private_channels).values(
+        guild_id=guild_id,
+        user_id=user_id,
+        channel_id=channel_id
+    )
+    async with database.transaction():
+        await _ensure_user_and_guild(user_id, guild_id, username, guild_name)
         await database.execute(
-            users.insert().values(user_id=user_id, username=username)
+            upsert.on_conflict_do_update(
+                index_elements=["guild_id", "user_id"],
+                set_={"channel_id": upsert.excluded.channel_id}
+            )
         )
-    
-    # Ensure guild exists
-    guild_query = guilds.select().where(guilds.c.guild_id == guild_id)
-    guild_exists = await database.fetch_one(guild_query)
-    if not guild_exists:
+
+
+async def create_user_channels_bulk(guild_id: int, rows: list[dict], guild_name: str = None):
+    """Create or update many user_private_channel records for a guild in one transaction.
+    Each row: {user_id, channel_id, username}. Also ensures the user and guild records exist."""
+    if not rows:
+        return
+    async with database.transaction():
         await database.execute(
-            guilds.insert().values(guild_id=guild_id, name=guild_name)
+            sqlite_insert(guilds).values(guild_id=guild_id, name=guild_name).on_conflict_do_nothing()
         )
-    
-    # Check if user_private_channel record already exists
-    channel_query = user_private_channels.select().where(
-        (user_private_channels.c.guild_id == guild_id) &
-        (user_private_channels.c.user_id == user_id)
-    )
-    existing_record = await database.fetch_one(channel_query)
-    
-    if existing_record:
-        # Update existing record
-        await database.execute(
-            user_private_channels.update().where(
-                (user_private_channels.c.guild_id == guild_id) &
-                (user_private_channels.c.user_id == user_id)
-            ).values(channel_id=channel_id)
+        await database.execute_many(
+            sqlite_insert(users).on_conflict_do_nothing(),
+            [{"user_id": row["user_id"], "username": row.get("username")} for row in rows]
         )
-    else:
-        # Create new record
-        await database.execute(
-            user_private_channels.insert().values(
-                guild_id=guild_id,
-                user_id=user_id,
-                channel_id=channel_id
-            )
+        upsert = sqlite_insert(user_private_channels)
+        await database.execute_many(
+            upsert.on_conflict_do_update(
+                index_elements=["guild_id", "user_id"],
+                set_={"channel_id": upsert.excluded.channel_id}
+            ),
+            [{"guild_id": guild_id, "user_id": row["user_id"], "channel_id": row["channel_id"]} for row in rows]
         )
 
 
@@ -70,104 +122,140 @@ async def delete_user_channel(guild_id: int, user_id: int):
     )
 
 
-async def can_award_xp(guild_id: int, user_id: int) -> bool:
-    """Check if a user can receive XP (rate limiting: at most one message per minute).
-    Returns True if they can receive XP, False otherwise."""
-    # Ensure user and guild exist
-    user_query = users.select().where(users.c.user_id == user_id)
-    user_exists = await database.fetch_one(user_query)
-    if not user_exists:
-        await database.execute(
-            users.insert().values(user_id=user_id)
-        )
-    
-    guild_query = guilds.select().where(guilds.c.guild_id == guild_id)
-    guild_exists = await database.fetch_one(guild_query)
-    if not guild_exists:
-        await database.execute(
-            guilds.insert().values(guild_id=guild_id)
-        )
-    
-    # Check if user sent a message in the last minute
-    one_minute_ago = (datetime.utcnow() - timedelta(minutes=1)).isoformat()
-    query = message_logs.select().where(
-        (message_logs.c.guild_id == guild_id) &
-        (message_logs.c.user_id == user_id) &
-        (message_logs.c.timestamp >= one_minute_ago)
-    ).order_by(message_logs.c.timestamp.desc()).limit(1)
-    
-    recent_message = await database.fetch_one(query)
-    return recent_message is None
-
-
-async def award_xp(guild_id: int, user_id: int, xp_amount: float, username: str = None, guild_name: str = None):
-    """Award XP to a user. XP is rounded to 3 decimal places."""
-    # Ensure user exists
-    user_query = users.select().where(users.c.user_id == user_id)
-    user_exists = await database.fetch_one(user_query)
-    if not user_exists:
-        await database.execute(
-            users.insert().values(user_id=user_id, username=username)
-        )
-    
-    # Ensure guild exists
-    guild_query = guilds.select().where(guilds.c.guild_id == guild_id)
-    guild_exists = await database.fetch_one(guild_query)
-    if not guild_exists:
-        await database.execute(
-            guilds.insert().values(guild_id=guild_id, name=guild_name)
-        )
-    
-    # Round XP to 3 decimal places
-    xp_amount = round(xp_amount, 3)
-    
-    # Get current timestamp
-    timestamp = datetime.utcnow().isoformat()
-    
-    # Log the message and XP awarded
+async def delete_user_channels_bulk(guild_id: int, channel_ids: list[int]):
+    """Delete all user_private_channel records pointing at the given channels in a single query."""
+    if not channel_ids:
+        return
     await database.execute(
-        message_logs.insert().values(
-            guild_id=guild_id,
-            user_id=user_id,
-            timestamp=timestamp,
-            xp_awarded=xp_amount
+        user_private_channels.delete().where(
+            (user_private_channels.c.guild_id == guild_id) &
+            (user_private_channels.c.channel_id.in_(channel_ids))
         )
     )
-    
-    # Update or create user_xp record
-    xp_query = user_xp.select().where(
-        (user_xp.c.guild_id == guild_id) &
-        (user_xp.c.user_id == user_id)
-    )
-    existing_xp = await database.fetch_one(xp_query)
-    
-    if existing_xp:
-        # Calculate new total XP from message_logs within 3 days
-        three_days_ago = (datetime.utcnow() - timedelta(days=3)).isoformat()
-        total_xp_query = message_logs.select().where(
-            (message_logs.c.guild_id == guild_id) &
-            (message_logs.c.user_id == user_id) &
-            (message_logs.c.timestamp >= three_days_ago)
-        )
-        all_messages = await database.fetch_all(total_xp_query)
-        total_xp = round(sum(float(msg["xp_awarded"]) for msg in all_messages), 3)
-        
-        await database.execute(
-            user_xp.update().where(
-                (user_xp.c.guild_id == guild_id) &
-                (user_xp.c.user_id == user_id)
-            ).values(xp=total_xp, updated_at=timestamp)
-        )
-    else:
-        # Create new user_xp record
+
+
+# message_logs rows not yet written; flushed in batches by flush_message_logs
+_log_buffer: list[dict] = []
+_LOG_BUFFER_MAX = 100
+
+# (guild_id, user_id) -> epoch seconds of the user's latest logged message, for rate limiting
+_last_logged: dict[tuple[int, int], int] = {}
+
+# Held while XP is added and while buffered logs are written, so reconcile_user_xp never
+# recomputes a total that already includes XP whose log row hasn't reached message_logs
+_xp_lock = asyncio.Lock()
+
+
+async def flush_message_logs():
+    """Write buffered message_logs rows in a single transaction."""
+    async with _xp_lock:
+        await _flush_message_logs()
+
+
+async def _flush_message_logs():
+    global _log_buffer
+    if not _log_buffer:
+        return
+    rows, _log_buffer = _log_buffer, []
+    try:
+        async with database.transaction():
+            await database.execute_many(message_logs.insert(), rows)
+    except Exception:
+        # Put the rows back so the next flush retries them
+        _log_buffer[:0] = rows
+        raise
+
+
+async def award_xp(guild_id: int, user_id: int, xp_amount: float, username: str = None, guild_name: str = None,
+                   now: int | None = None):
+    """Award XP to a user. XP is stored as integer milli-XP, so it is rounded to 3 decimal places.
+    now is the message's epoch time, if the caller already has it."""
+    milli_xp = round(xp_amount * 1000)
+
+    # One clock read; updated_at keeps its ISO text format
+    if now is None:
+        now = int(time.time())
+    timestamp = datetime.fromtimestamp(now, timezone.utc).strftime("%Y-%m-%dT%H:%M:%S")
+
+    _last_logged[(guild_id, user_id)] = now
+    values = {"guild_id": guild_id, "user_id": user_id, "xp": milli_xp, "updated_at": timestamp}
+    if _EXPLAIN:
+        await _explain_once(_ADD_USER_XP_SQL, values)
+
+    async with _xp_lock:
+        # Log the message and XP awarded; written in batches by flush_message_logs
+        _log_buffer.append({
+            "guild_id": guild_id,
+            "user_id": user_id,
+            "timestamp": now,
+            "xp_awarded": milli_xp,
+        })
+
+        # user_xp.xp is a running 3-day total: add to it here, and reconcile_user_xp
+        # subtracts messages once they age out of the window
+        async with database.transaction():
+            await _ensure_user_and_guild(user_id, guild_id, username, guild_name)
+            await database.execute(_ADD_USER_XP_SQL, values)
+
+    if len(_log_buffer) >= _LOG_BUFFER_MAX:
+        await flush_message_logs()
+
+
+async def try_award_xp(guild_id: int, user_id: int, base_xp: float, extra_xp: float = 0.0,
+                       username: str = None, guild_name: str = None) -> bool:
+    """Log a message and award its XP in one call.
+    base_xp is credited only if the user has no logged message in the last minute; extra_xp
+    is always credited. Returns True if base_xp was credited."""
+    now = int(time.time())
+    key = (guild_id, user_id)
+    last = _last_logged.get(key)
+    if last is None:
+        # First message since startup; every later one is tracked in memory
+        values = {"guild_id": guild_id, "user_id": user_id}
+        if _EXPLAIN:
+            await _explain_once(_LAST_LOG_SQL, values)
+        last = max(await database.fetch_val(_LAST_LOG_SQL, values) or 0, _last_logged.get(key, 0))
+
+    # Decide and record synchronously so concurrent messages can't both pass the check
+    credited = last < now - _RATE_LIMIT
+    _last_logged[key] = now
+    await award_xp(guild_id, user_id, (base_xp if credited else 0.0) + extra_xp, username, guild_name, now)
+    return credited
+
+
+async def reconcile_user_xp(aged_since: int | None = None) -> int:
+    """Recompute the 3-day user_xp totals of users whose messages have aged out of the window.
+    Only users with messages logged between aged_since and the new cutoff are touched (all
+    users with aged messages when aged_since is None), plus any non-zero total with nothing
+    left in the window, whose aged rows may already have been pruned. Returns the cutoff to
+    pass next time."""
+    cutoff = int(time.time()) - _XP_WINDOW
+    same_user = (message_logs.c.guild_id == user_xp.c.guild_id) & (message_logs.c.user_id == user_xp.c.user_id)
+
+    aged = same_user & (message_logs.c.timestamp < cutoff)
+    if aged_since is not None:
+        aged &= message_logs.c.timestamp >= aged_since
+
+    in_window = same_user & (message_logs.c.timestamp >= cutoff)
+    total_xp = select(func.coalesce(func.sum(message_logs.c.xp_awarded), 0)).where(in_window).scalar_subquery()
+    stale = (user_xp.c.xp != 0) & ~select(message_logs.c.id).where(in_window).exists()
+    # Totals are recomputed from message_logs, so it must hold every awarded message; the
+    # lock keeps awards from adding XP between the flush and the recompute
+    async with _xp_lock:
+        await _flush_message_logs()
         await database.execute(
-            user_xp.insert().values(
-                guild_id=guild_id,
-                user_id=user_id,
-                xp=round(xp_amount, 3),
-                updated_at=timestamp
-            )
+            user_xp.update().where(select(message_logs.c.id).where(aged).exists() | stale).values(xp=total_xp)
         )
+    return cutoff
+
+
+async def prune_message_logs(retain_days: int = 8) -> int:
+    """Delete message logs older than retain_days; XP reads never look back further than 3 days.
+    Returns the number of rows deleted."""
+    cutoff = int(time.time()) - retain_days * _DAY
+    async with database.transaction():
+        await database.execute(message_logs.delete().where(message_logs.c.timestamp < cutoff))
+        return await database.fetch_val("SELECT changes()")
 
 
 async def get_user_xp(guild_id: int, user_id: int, days: int = 3) -> float:
@@ -181,60 +269,75 @@ async def get_user_xp(guild_id: int, user_id: int, days: int = 3) -> float:
     Returns:
         XP rounded to 3 decimal places.
     """
+    # The running total already covers the default window
+    if days == 3:
+        milli_xp = await database.fetch_val(_USER_XP_SQL, {"guild_id": guild_id, "user_id": user_id})
+        return milli_xp / 1000 if milli_xp is not None else 0.0
+
     # Calculate XP from message_logs within the specified period
-    period_start = (datetime.utcnow() - timedelta(days=days)).isoformat()
-    query = message_logs.select().where(
+    period_start = int(time.time()) - days * _DAY
+    query = select(func.coalesce(func.sum(message_logs.c.xp_awarded), 0)).where(
         (message_logs.c.guild_id == guild_id) &
         (message_logs.c.user_id == user_id) &
         (message_logs.c.timestamp >= period_start)
     )
-    all_messages = await database.fetch_all(query)
-    total_xp = round(sum(float(msg["xp_awarded"]) for msg in all_messages), 3)
-    return total_xp
+    milli_xp = await database.fetch_val(query)
+    milli_xp += sum(
+        row["xp_awarded"] for row in _log_buffer
+        if row["guild_id"] == guild_id and row["user_id"] == user_id and row["timestamp"] >= period_start
+    )
+    return milli_xp / 1000
+
+
+# guild_id -> (expires_at, settings); guild settings change rarely, set_* writes pop the entry
+_settings_cache: dict[int, tuple[float, dict]] = {}
+_SETTINGS_TTL = 300
+
+
+async def _get_guild_settings(guild_id: int) -> dict:
+    """Get welcome_message, active_role_id and active_days for a guild, cached for _SETTINGS_TTL seconds."""
+    cached = _settings_cache.get(guild_id)
+    if cached and cached[0] > time.monotonic():
+        return cached[1]
+    query = select(
+        guild_settings.c.welcome_message,
+        guild_settings.c.active_role_id,
+        guild_settings.c.active_days,
+    ).where(guild_settings.c.guild_id == guild_id)
+    result = await database.fetch_one(query)
+    settings = {
+        "welcome_message": result["welcome_message"] if result else None,
+        "active_role_id": result["active_role_id"] if result else None,
+        "active_days": result["active_days"] if result else None,
+    }
+    _settings_cache[guild_id] = (time.monotonic() + _SETTINGS_TTL, settings)
+    return settings
 
 
 async def get_welcome_message(guild_id: int) -> str | None:
     """Get the welcome message template for a guild.
     Returns the message template if set, None otherwise."""
-    query = guild_settings.select().where(guild_settings.c.guild_id == guild_id)
-    result = await database.fetch_one(query)
-    return result["welcome_message"] if result else None
+    return (await _get_guild_settings(guild_id))["welcome_message"]
 
 
 async def set_welcome_message(guild_id: int, message: str, guild_name: str = None):
     """Set the welcome message template for a guild."""
-    # Ensure guild exists
-    guild_query = guilds.select().where(guilds.c.guild_id == guild_id)
-    guild_exists = await database.fetch_one(guild_query)
-    if not guild_exists:
+    async with database.transaction():
         await database.execute(
-            guilds.insert().values(guild_id=guild_id, name=guild_name)
+            sqlite_insert(guilds).values(guild_id=guild_id, name=guild_name).on_conflict_do_nothing()
         )
-
-    # Check if guild_settings record already exists
-    settings_query = guild_settings.select().where(guild_settings.c.guild_id == guild_id)
-    existing_record = await database.fetch_one(settings_query)
-
-    if existing_record:
-        # Update existing record
         await database.execute(
-            guild_settings.update().where(
-                guild_settings.c.guild_id == guild_id
-            ).values(welcome_message=message)
-        )
-    else:
-        # Create new record
-        await database.execute(
-            guild_settings.insert().values(
-                guild_id=guild_id,
-                welcome_message=message
+            sqlite_insert(guild_settings).values(guild_id=guild_id, welcome_message=message).on_conflict_do_update(
+                index_elements=["guild_id"],
+                set_={"welcome_message": message}
             )
         )
+    _settings_cache.pop(guild_id, None)
 
 
 async def update_last_journal_message(guild_id: int, user_id: int):
     """Update the last journal message timestamp for a user's personal channel."""
-    timestamp = datetime.utcnow().isoformat()
+    timestamp = int(time.time())
     await database.execute(
         user_private_channels.update().where(
             (user_private_channels.c.guild_id == guild_id) &
@@ -243,53 +346,46 @@ async def update_last_journal_message(guild_id: int, user_id: int):
     )
 
 
-async def get_active_users(guild_id: int, days: int = 3) -> list[int]:
-    """Get list of user IDs who have journaled in their personal channel within the last N days."""
-    cutoff = (datetime.utcnow() - timedelta(days=days)).isoformat()
-    query = user_private_channels.select().where(
-        (user_private_channels.c.guild_id == guild_id) &
-        (user_private_channels.c.last_journal_message >= cutoff)
-    )
-    results = await database.fetch_all(query)
-    return [row["user_id"] for row in results]
-
-
 async def get_active_role_id(guild_id: int) -> int | None:
     """Get the active role ID for a guild."""
-    query = guild_settings.select().where(guild_settings.c.guild_id == guild_id)
-    result = await database.fetch_one(query)
-    return result["active_role_id"] if result else None
+    return (await _get_guild_settings(guild_id))["active_role_id"]
 
 
-async def set_active_role_id(guild_id: int, role_id: int, guild_name: str = None):
-    """Set the active role ID for a guild."""
-    # Ensure guild exists
-    guild_query = guilds.select().where(guilds.c.guild_id == guild_id)
-    guild_exists = await database.fetch_one(guild_query)
-    if not guild_exists:
-        await database.execute(
-            guilds.insert().values(guild_id=guild_id, name=guild_name)
-        )
+async def get_all_active_role_ids() -> dict[int, int]:
+    """Get every configured active role as {guild_id: role_id}."""
+    query = select(guild_settings.c.guild_id, guild_settings.c.active_role_id).where(
+        guild_settings.c.active_role_id.is_not(None)
+    )
+    results = await database.fetch_all(query)
+    return {row["guild_id"]: row["active_role_id"] for row in results}
 
-    # Check if guild_settings record already exists
-    settings_query = guild_settings.select().where(guild_settings.c.guild_id == guild_id)
-    existing_record = await database.fetch_one(settings_query)
 
-    if existing_record:
-        # Update existing record
+async def set_active_role_id(guild_id: int, role_id: int, guild_name: str = None):
+    """Set the active role ID for a guild."""
+    async with database.transaction():
         await database.execute(
-            guild_settings.update().where(
-                guild_settings.c.guild_id == guild_id
-            ).values(active_role_id=role_id)
+            sqlite_insert(guilds).values(guild_id=guild_id, name=guild_name).on_conflict_do_nothing()
         )
-    else:
-        # Create new record
         await database.execute(
-            guild_settings.insert().values(
-                guild_id=guild_id,
-                active_role_id=role_id
+            sqlite_insert(guild_settings).values(guild_id=guild_id, active_role_id=role_id).on_conflict_do_update(
+                index_elements=["guild_id"],
+                set_={"active_role_id": role_id}
             )
         )
+    _settings_cache.pop(guild_id, None)
+
+
+async def bulk_set_defaults(guild_rows: list[dict]):
+    """Ensure guild and guild_settings records exist for many guilds at once.
+    Each row: {guild_id, name}. Existing records are left untouched."""
+    if not guild_rows:
+        return
+    async with database.transaction():
+        await database.execute_many(sqlite_insert(guilds).on_conflict_do_nothing(), guild_rows)
+        await database.execute_many(
+            sqlite_insert(guild_settings).on_conflict_do_nothing(),
+            [{"guild_id": row["guild_id"]} for row in guild_rows]
+        )
 
 
 async def create_reminder(guild_id: int, user_id: int, channel_id: int, message_link: str, message_preview: str | None, remind_at: datetime):
@@ -301,25 +397,30 @@ async def create_reminder(guild_id: int, user_id: int, channel_id: int, message_
             channel_id=channel_id,
             message_link=message_link,
             message_preview=message_preview,
-            remind_at=remind_at.isoformat(),
+            remind_at=int(remind_at.timestamp()),
         )
     )
 
 
-async def get_due_reminders():
-    """Get all reminders that are due and not yet completed."""
-    now = datetime.utcnow().isoformat()
-    query = reminders.select().where(
-        (reminders.c.remind_at <= now) &
-        (reminders.c.completed == 0)
-    )
-    return await database.fetch_all(query)
+async def get_due_reminder_ids() -> list[int]:
+    """Get the ids of all reminders that are due and not yet completed."""
+    values = {"now": int(time.time())}
+    if _EXPLAIN:
+        await _explain_once(_DUE_REMINDER_IDS_SQL, values)
+    results = await database.fetch_all(_DUE_REMINDER_IDS_SQL, values)
+    return [row[0] for row in results]
 
 
-async def mark_reminder_completed(reminder_id: int):
-    """Mark a reminder as completed."""
+async def claim_reminder(reminder_id: int) -> Record | None:
+    """Mark a reminder completed and return it, in one statement; None if it was already claimed.
+    A reminder that fails to send can be handed back with release_reminder."""
+    return await database.fetch_one(_CLAIM_REMINDER_SQL, {"id": reminder_id})
+
+
+async def release_reminder(reminder_id: int):
+    """Mark a claimed reminder as not completed so the next check retries it."""
     await database.execute(
-        reminders.update().where(reminders.c.id == reminder_id).values(completed=1)
+        reminders.update().where(reminders.c.id == reminder_id).values(completed=0)
     )
 
 
@@ -330,6 +431,9 @@ async def init_database():
     sync_url = DATABASE_URL.replace("+aiosqlite", "")
     engine = create_engine(sync_url)
     metadata.create_all(engine)
+    # WAL is persistent on the file; lets the role sweep's reads run alongside writes
+    with engine.connect() as conn:
+        conn.exec_driver_sql("PRAGMA journal_mode=WAL")
     engine.dispose()
 
 
@@ -337,35 +441,24 @@ async def init_database():
 
 async def join_one_on_one_pool(guild_id: int, user_id: int) -> bool:
     """Add a user to the 1-1 matching pool. Returns True if newly joined, False if already in pool."""
-    query = one_on_one_pool.select().where(
-        (one_on_one_pool.c.guild_id == guild_id) &
-        (one_on_one_pool.c.user_id == user_id)
-    )
-    existing = await database.fetch_one(query)
-    if existing:
-        return False
-    await database.execute(
-        one_on_one_pool.insert().values(guild_id=guild_id, user_id=user_id)
+    # RETURNING yields no row when the conflict clause skipped the insert
+    query = (
+        sqlite_insert(one_on_one_pool)
+        .values(guild_id=guild_id, user_id=user_id)
+        .on_conflict_do_nothing()
+        .returning(one_on_one_pool.c.user_id)
     )
-    return True
+    return await database.fetch_val(query) is not None
 
 
 async def leave_one_on_one_pool(guild_id: int, user_id: int) -> bool:
     """Remove a user from the 1-1 matching pool. Returns True if removed, False if not in pool."""
-    query = one_on_one_pool.select().where(
+    # RETURNING tells us whether a row was deleted without a separate SELECT
+    query = one_on_one_pool.delete().where(
         (one_on_one_pool.c.guild_id == guild_id) &
         (one_on_one_pool.c.user_id == user_id)
-    )
-    existing = await database.fetch_one(query)
-    if not existing:
-        return False
-    await database.execute(
-        one_on_one_pool.delete().where(
-            (one_on_one_pool.c.guild_id == guild_id) &
-            (one_on_one_pool.c.user_id == user_id)
-        )
-    )
-    return True
+    ).returning(one_on_one_pool.c.user_id)
+    return await database.fetch_val(query) is not None
 
 
 async def get_one_on_one_pool_status(guild_id: int, user_id: int) -> dict | None:
@@ -384,8 +477,13 @@ async def get_one_on_one_pool_status(guild_id: int, user_id: int) -> dict | None
     }
 
 
-async def set_one_on_one_skip(guild_id: int, user_id: int, skip_until: str | None):
-    """Set or clear the skip_until date for a user."""
+def _week_start_epoch(week_start: str) -> int:
+    """Convert a week_start date string (YYYY-MM-DD) to epoch seconds at UTC midnight."""
+    return int(datetime.fromisoformat(week_start).replace(tzinfo=timezone.utc).timestamp())
+
+
+async def set_one_on_one_skip(guild_id: int, user_id: int, skip_until: int | None):
+    """Set or clear the skip_until time (epoch seconds) for a user."""
     await database.execute(
         one_on_one_pool.update().where(
             (one_on_one_pool.c.guild_id == guild_id) &
@@ -394,19 +492,26 @@ async def set_one_on_one_skip(guild_id: int, user_id: int, skip_until: str | Non
     )
 
 
-async def get_available_pool_members(guild_id: int, week_start: str) -> list[int]:
-    """Get users in pool who are not skipping this week."""
-    query = one_on_one_pool.select().where(
+async def get_unmatched_available_members(guild_id: int, week_start: str) -> list[int]:
+    """Get users in pool who are not skipping this week and haven't been matched this week."""
+    matched_this_week = select(one_on_one_matches.c.id).where(
+        (one_on_one_matches.c.guild_id == guild_id) &
+        (one_on_one_matches.c.week_start == week_start) &
+        ((one_on_one_matches.c.user1_id == one_on_one_pool.c.user_id) |
+         (one_on_one_matches.c.user2_id == one_on_one_pool.c.user_id))
+    )
+    query = select(one_on_one_pool.c.user_id).where(
         (one_on_one_pool.c.guild_id == guild_id) &
-        ((one_on_one_pool.c.skip_until == None) | (one_on_one_pool.c.skip_until <= week_start))
+        ((one_on_one_pool.c.skip_until == None) | (one_on_one_pool.c.skip_until <= _week_start_epoch(week_start))) &
+        ~matched_this_week.exists()
     )
     results = await database.fetch_all(query)
-    return [row["user_id"] for row in results]
+    return [row[0] for row in results]
 
 
 async def mark_user_sat_out(guild_id: int, user_id: int):
     """Mark that a user sat out this week (for fair rotation)."""
-    timestamp = datetime.utcnow().isoformat()
+    timestamp = int(time.time())
     await database.execute(
         one_on_one_pool.update().where(
             (one_on_one_pool.c.guild_id == guild_id) &
@@ -415,15 +520,15 @@ async def mark_user_sat_out(guild_id: int, user_id: int):
     )
 
 
-async def get_users_who_sat_out_recently(guild_id: int, since: str) -> list[int]:
-    """Get users who sat out since a given date."""
-    query = one_on_one_pool.select().where(
+async def get_users_who_sat_out_recently(guild_id: int, since: int) -> list[int]:
+    """Get users who sat out since a given time (epoch seconds)."""
+    query = select(one_on_one_pool.c.user_id).where(
         (one_on_one_pool.c.guild_id == guild_id) &
         (one_on_one_pool.c.sat_out_at != None) &
         (one_on_one_pool.c.sat_out_at >= since)
     )
     results = await database.fetch_all(query)
-    return [row["user_id"] for row in results]
+    return [row[0] for row in results]
 
 
 # --- 1-1 Match Management ---
@@ -442,158 +547,163 @@ async def create_one_on_one_match(guild_id: int, week_start: str, user1_id: int,
     return result
 
 
-async def get_match_by_thread(thread_id: int) -> dict | None:
-    """Get a match by its thread ID."""
-    query = one_on_one_matches.select().where(one_on_one_matches.c.thread_id == thread_id)
-    result = await database.fetch_one(query)
-    if not result:
-        return None
-    return dict(result._mapping)
+async def bulk_create_one_on_one_matches(rows: list[dict]):
+    """Create many match records in one transaction.
+    Each row: {guild_id, week_start, user1_id, user2_id, thread_id}."""
+    if not rows:
+        return
+    async with database.transaction():
+        await database.execute_many(one_on_one_matches.insert(), rows)
 
 
-async def get_match_by_id(match_id: int) -> dict | None:
-    """Get a match by its ID."""
-    query = one_on_one_matches.select().where(one_on_one_matches.c.id == match_id)
-    result = await database.fetch_one(query)
-    if not result:
-        return None
-    return dict(result._mapping)
+async def get_match_by_thread(thread_id: int) -> Record | None:
+    """Get a match's id, guild, week, members and completion time by its thread ID."""
+    c = one_on_one_matches.c
+    query = select(c.id, c.guild_id, c.week_start, c.user1_id, c.user2_id, c.completed_at).where(
+        c.thread_id == thread_id
+    )
+    return await database.fetch_one(query)
 
 
-async def update_match_status(match_id: int, user_id: int, status: str):
-    """Update a user's status in a match (pending/confirmed/declined)."""
-    match = await get_match_by_id(match_id)
-    if not match:
-        return
-    if match["user1_id"] == user_id:
-        await database.execute(
-            one_on_one_matches.update().where(one_on_one_matches.c.id == match_id).values(user1_status=status)
-        )
-    elif match["user2_id"] == user_id:
-        await database.execute(
-            one_on_one_matches.update().where(one_on_one_matches.c.id == match_id).values(user2_status=status)
+async def confirm_match(match_id: int, user_id: int) -> Record | None:
+    """Mark a user's side of an undecided match confirmed, completing the match once both have.
+    Returns the match's completed_at (set only if this confirmation completed it), or None if
+    the match was already decided. One conditional statement, so repeated clicks can't race."""
+    c = one_on_one_matches.c
+    user1_status = case((c.user1_id == user_id, "confirmed"), else_=c.user1_status)
+    user2_status = case((c.user2_id == user_id, "confirmed"), else_=c.user2_status)
+    query = (
+        one_on_one_matches.update()
+        .where((c.id == match_id) & (c.completed_at == None))
+        .values(
+            user1_status=user1_status,
+            user2_status=user2_status,
+            completed_at=case(
+                ((user1_status == "confirmed") & (user2_status == "confirmed"), datetime.utcnow().isoformat()),
+                else_=None,
+            ),
         )
+        .returning(c.completed_at)
+    )
+    return await database.fetch_one(query)
 
 
-async def complete_match(match_id: int):
-    """Mark a match as completed."""
-    timestamp = datetime.utcnow().isoformat()
-    await database.execute(
-        one_on_one_matches.update().where(one_on_one_matches.c.id == match_id).values(completed_at=timestamp)
+async def decline_match(match_id: int, user_id: int) -> bool:
+    """Mark a user's side of an undecided match declined and complete it.
+    Returns False if the match was already decided."""
+    c = one_on_one_matches.c
+    query = (
+        one_on_one_matches.update()
+        .where((c.id == match_id) & (c.completed_at == None))
+        .values(
+            user1_status=case((c.user1_id == user_id, "declined"), else_=c.user1_status),
+            user2_status=case((c.user2_id == user_id, "declined"), else_=c.user2_status),
+            completed_at=datetime.utcnow().isoformat(),
+        )
+        .returning(c.id)
     )
+    return await database.fetch_val(query) is not None
 
 
 async def increment_match_reminder(match_id: int):
     """Increment the reminder count for a match."""
-    match = await get_match_by_id(match_id)
-    if match:
-        await database.execute(
-            one_on_one_matches.update().where(one_on_one_matches.c.id == match_id).values(
-                reminder_count=match["reminder_count"] + 1
-            )
+    await database.execute(
+        one_on_one_matches.update().where(one_on_one_matches.c.id == match_id).values(
+            reminder_count=one_on_one_matches.c.reminder_count + 1
         )
+    )
 
 
-async def get_matches_needing_reminder(guild_id: int, week_start: str, max_reminders: int) -> list[dict]:
+async def get_matches_needing_reminder(guild_id: int, week_start: str, max_reminders: int) -> list[Record]:
     """Get matches that have pending status and haven't exceeded reminder limit."""
-    query = one_on_one_matches.select().where(
+    c = one_on_one_matches.c
+    query = select(
+        c.id, c.week_start, c.thread_id, c.user1_id, c.user2_id, c.user1_status, c.user2_status
+    ).where(
         (one_on_one_matches.c.guild_id == guild_id) &
         (one_on_one_matches.c.week_start == week_start) &
         (one_on_one_matches.c.completed_at == None) &
         (one_on_one_matches.c.reminder_count < max_reminders) &
         ((one_on_one_matches.c.user1_status == "pending") | (one_on_one_matches.c.user2_status == "pending"))
     )
-    results = await database.fetch_all(query)
-    return [dict(row._mapping) for row in results]
+    return await database.fetch_all(query)
 
 
-async def get_user_match_history(guild_id: int, user_id: int, limit: int = 10) -> list[dict]:
+async def get_user_match_history(guild_id: int, user_id: int, limit: int = 10) -> list[Record]:
     """Get a user's past matches."""
-    query = one_on_one_matches.select().where(
+    c = one_on_one_matches.c
+    query = select(c.user1_id, c.user2_id, c.week_start, c.completed_at).where(
         (one_on_one_matches.c.guild_id == guild_id) &
         ((one_on_one_matches.c.user1_id == user_id) | (one_on_one_matches.c.user2_id == user_id))
     ).order_by(one_on_one_matches.c.created_at.desc()).limit(limit)
-    results = await database.fetch_all(query)
-    return [dict(row._mapping) for row in results]
+    return await database.fetch_all(query)
 
 
-async def get_users_matched_this_week(guild_id: int, week_start: str) -> set[int]:
-    """Get all user IDs who have been matched this week."""
-    query = one_on_one_matches.select().where(
-        (one_on_one_matches.c.guild_id == guild_id) &
-        (one_on_one_matches.c.week_start == week_start)
+async def get_all_user_channels(guild_id: int) -> list[dict]:
+    """Get all user channel mappings for a guild.
+    Returns list of dicts with user_id and channel_id."""
+    query = user_private_channels.select().where(
+        user_private_channels.c.guild_id == guild_id
     )
     results = await database.fetch_all(query)
-    users_set = set()
-    for row in results:
-        users_set.add(row["user1_id"])
-        users_set.add(row["user2_id"])
-    return users_set
+    return [{"user_id": row["user_id"], "channel_id": row["channel_id"]} for row in results]
 
 
-async def get_user_partners_this_week(guild_id: int, user_id: int, week_start: str) -> set[int]:
-    """Get the user IDs that a specific user has been paired with this week."""
-    query = one_on_one_matches.select().where(
-        (one_on_one_matches.c.guild_id == guild_id) &
-        (one_on_one_matches.c.week_start == week_start) &
-        ((one_on_one_matches.c.user1_id == user_id) | (one_on_one_matches.c.user2_id == user_id))
+async def get_user_channel_map(guild_id: int) -> dict[int, int]:
+    """Get all user channel mappings for a guild as {user_id: channel_id}."""
+    query = select(user_private_channels.c.user_id, user_private_channels.c.channel_id).where(
+        user_private_channels.c.guild_id == guild_id
     )
     results = await database.fetch_all(query)
-    partners = set()
-    for row in results:
-        if row["user1_id"] == user_id:
-            partners.add(row["user2_id"])
-        else:
-            partners.add(row["user1_id"])
-    return partners
+    return {row["user_id"]: row["channel_id"] for row in results}
 
 
-async def get_all_user_channels(guild_id: int) -> list[dict]:
-    """Get all user channel mappings for a guild.
-    Returns list of dicts with user_id and channel_id."""
-    query = user_private_channels.select().where(
-        user_private_channels.c.guild_id == guild_id
-    )
+async def get_all_channel_owners() -> dict[int, int]:
+    """Get every personal channel across all guilds as {channel_id: user_id}."""
+    query = select(user_private_channels.c.channel_id, user_private_channels.c.user_id)
     results = await database.fetch_all(query)
-    return [{"user_id": row["user_id"], "channel_id": row["channel_id"]} for row in results]
+    return {row["channel_id"]: row["user_id"] for row in results}
+
+
+async def get_all_last_posts() -> dict[tuple[int, int], float]:
+    """Get every stored last-post time as {(channel_id, user_id): epoch seconds}."""
+    results = await database.fetch_all(user_last_posts.select())
+    return {(row["channel_id"], row["user_id"]): row["posted_at"] for row in results}
+
+
+async def save_last_posts(rows: list[dict]):
+    """Upsert last-post times. Each row: {channel_id, user_id, posted_at}."""
+    if not rows:
+        return
+    upsert = sqlite_insert(user_last_posts)
+    await database.execute_many(
+        upsert.on_conflict_do_update(
+            index_elements=["channel_id", "user_id"],
+            set_={"posted_at": upsert.excluded.posted_at}
+        ),
+        rows
+    )
 
 
 async def get_active_days(guild_id: int) -> int:
     """Get the number of days of inactivity before losing the active role. Default 3."""
-    query = guild_settings.select().where(guild_settings.c.guild_id == guild_id)
-    result = await database.fetch_one(query)
-    if result and result["active_days"] is not None:
-        return result["active_days"]
-    return 3
+    active_days = (await _get_guild_settings(guild_id))["active_days"]
+    return active_days if active_days is not None else 3
 
 
 async def set_active_days(guild_id: int, days: int, guild_name: str = None):
     """Set the number of days of inactivity before losing the active role."""
-    # Ensure guild exists
-    guild_query = guilds.select().where(guilds.c.guild_id == guild_id)
-    guild_exists = await database.fetch_one(guild_query)
-    if not guild_exists:
-        await database.execute(
-            guilds.insert().values(guild_id=guild_id, name=guild_name)
-        )
-
-    # Check if guild_settings record already exists
-    settings_query = guild_settings.select().where(guild_settings.c.guild_id == guild_id)
-    existing_record = await database.fetch_one(settings_query)
-
-    if existing_record:
+    async with database.transaction():
         await database.execute(
-            guild_settings.update().where(
-                guild_settings.c.guild_id == guild_id
-            ).values(active_days=days)
+            sqlite_insert(guilds).values(guild_id=guild_id, name=guild_name).on_conflict_do_nothing()
         )
-    else:
         await database.execute(
-            guild_settings.insert().values(
-                guild_id=guild_id,
-                active_days=days
+            sqlite_insert(guild_settings).values(guild_id=guild_id, active_days=days).on_conflict_do_update(
+                index_elements=["guild_id"],
+                set_={"active_days": days}
             )
         )
+    _settings_cache.pop(guild_id, None)
 
 
 # --- AI Companion ---
@@ -612,23 +722,18 @@ async def get_ai_config(guild_id: int, user_id: int) -> dict | None:
 
 async def upsert_ai_config(guild_id: int, user_id: int, system_prompt: str, enabled: bool = True):
     """Create or update a user's AI companion config."""
-    existing = await get_ai_config(guild_id, user_id)
-    if existing:
-        await database.execute(
-            user_ai_config.update().where(
-                (user_ai_config.c.guild_id == guild_id) &
-                (user_ai_config.c.user_id == user_id)
-            ).values(system_prompt=system_prompt, enabled=1 if enabled else 0)
-        )
-    else:
-        await database.execute(
-            user_ai_config.insert().values(
-                guild_id=guild_id,
-                user_id=user_id,
-                system_prompt=system_prompt,
-                enabled=1 if enabled else 0,
-            )
+    upsert = sqlite_insert(user_ai_config).values(
+        guild_id=guild_id,
+        user_id=user_id,
+        system_prompt=system_prompt,
+        enabled=1 if enabled else 0,
+    )
+    await database.execute(
+        upsert.on_conflict_do_update(
+            index_elements=["guild_id", "user_id"],
+            set_={"system_prompt": upsert.excluded.system_prompt, "enabled": upsert.excluded.enabled}
         )
+    )
 
 
 async def update_ai_system_prompt(guild_id: int, user_id: int, new_prompt: str):
@@ -653,27 +758,28 @@ async def get_ai_wakeups(guild_id: int, user_id: int) -> list[dict]:
 
 async def set_ai_wakeups(guild_id: int, user_id: int, wakeups: list[dict]):
     """Replace all wakeups for a user. Each wakeup: {label, schedule, message, next_run_at}."""
-    # Delete existing
-    await database.execute(
-        user_ai_wakeups.delete().where(
-            (user_ai_wakeups.c.guild_id == guild_id) &
-            (user_ai_wakeups.c.user_id == user_id)
-        )
-    )
-    # Insert new
-    for w in wakeups:
+    async with database.transaction():
+        # Delete existing
         await database.execute(
-            user_ai_wakeups.insert().values(
-                guild_id=guild_id,
-                user_id=user_id,
-                label=w["label"],
-                schedule=w["schedule"],
-                message=w.get("message", ""),
-                next_run_at=w.get("next_run_at"),
-                enabled=1,
-                channel_id=w.get("channel_id"),
+            user_ai_wakeups.delete().where(
+                (user_ai_wakeups.c.guild_id == guild_id) &
+                (user_ai_wakeups.c.user_id == user_id)
             )
         )
+        # Insert new
+        for w in wakeups:
+            await database.execute(
+                user_ai_wakeups.insert().values(
+                    guild_id=guild_id,
+                    user_id=user_id,
+                    label=w["label"],
+                    schedule=w["schedule"],
+                    message=w.get("message", ""),
+                    next_run_at=w.get("next_run_at"),
+                    enabled=1,
+                    channel_id=w.get("channel_id"),
+                )
+            )
 
 
 async def get_due_wakeups() -> list[dict]:
@@ -823,20 +929,18 @@ async def count_channel_messages(channel_id: int) -> int:
 
 async def get_latest_stored_message_id(channel_id: int) -> int | None:
     """Get the discord_message_id of the most recent stored message for a channel."""
-    query = channel_messages.select().where(
+    query = select(channel_messages.c.discord_message_id).where(
         channel_messages.c.channel_id == channel_id
     ).order_by(channel_messages.c.created_at.desc()).limit(1)
-    result = await database.fetch_one(query)
-    return result["discord_message_id"] if result else None
+    return await database.fetch_val(query)
 
 
 async def get_earliest_stored_message_id(channel_id: int) -> int | None:
     """Get the discord_message_id of the oldest stored message for a channel."""
-    query = channel_messages.select().where(
+    query = select(channel_messages.c.discord_message_id).where(
         channel_messages.c.channel_id == channel_id
     ).order_by(channel_messages.c.created_at.asc()).limit(1)
-    result = await database.fetch_one(query)
-    return result["discord_message_id"] if result else None
+    return await database.fetch_val(query)
 
 
 async def get_recent_messages_db(channel_id: int, limit: int = 200,
@@ -1,6 +1,30 @@
 import os
+import sqlite3
 from databases import Database
 
 DATABASE_PATH = os.getenv("DATABASE_PATH", "./data.db")
 DATABASE_URL = f"sqlite+aiosqlite:///{DATABASE_PATH}"
-database = Database(DATABASE_URL)
\ No newline at end of file
+
+# Per-connection settings; journal_mode=WAL is persistent and set once by init_database.
+# synchronous=NORMAL is safe under WAL and skips the fsync on every commit.
+_PRAGMAS = (
+    "PRAGMA synchronous=NORMAL",
+    "PRAGMA temp_store=MEMORY",
+    "PRAGMA cache_size=-64000",
+    "PRAGMA mmap_size=268435456",
+    "PRAGMA busy_timeout=5000",
+)
+
+
+class _TunedConnection(sqlite3.Connection):
+    """sqlite3 connection that applies _PRAGMAS as soon as it is opened."""
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        for pragma in _PRAGMAS:
+            self.execute(pragma)
+
+
+# databases opens an aiosqlite connection per task and forwards extra options to
+# sqlite3.connect, so the factory tunes every connection, not just the first one
+database = Database(DATABASE_URL, factory=_TunedConnection)
@@ -1,4 +1,4 @@
-from sqlalchemy import create_engine, text, inspect
+from sqlalchemy import create_engine, text
 from db.connection import DATABASE_URL
 
 
@@ -9,6 +9,15 @@ def _column_exists(conn, table_name: str, column_name: str) -> bool:
     return column_name in columns
 
 
+def _column_type(conn, table_name: str, column_name: str) -> str | None:
+    """Get the declared type of a column, or None if it doesn't exist."""
+    result = conn.execute(text(f"PRAGMA table_info({table_name})"))
+    for row in result:
+        if row[1] == column_name:
+            return row[2].upper()
+    return None
+
+
 # List of migrations to run in order
 # Each migration is a tuple of (name, migration_function)
 def migration_001_create_guild_settings(conn):
@@ -154,6 +163,83 @@ def migration_012_add_wakeup_channel_id(conn):
         conn.execute(text("ALTER TABLE user_ai_wakeups ADD COLUMN channel_id BIGINT"))
 
 
+def migration_013_create_user_last_posts(conn):
+    """Create user_last_posts table so role sweeps survive restarts without history scans."""
+    conn.execute(text("""
+        CREATE TABLE IF NOT EXISTS user_last_posts (
+            channel_id BIGINT NOT NULL,
+            user_id BIGINT NOT NULL,
+            posted_at REAL NOT NULL,
+            PRIMARY KEY (channel_id, user_id)
+        )
+    """))
+
+
+def migration_014_add_query_indexes(conn):
+    """Add composite indexes matching the XP, reminder, 1-1 match and journal query shapes."""
+    conn.execute(text("""
+        CREATE INDEX IF NOT EXISTS ix_message_logs_guild_user_ts
+        ON message_logs (guild_id, user_id, timestamp)
+    """))
+    conn.execute(text("""
+        CREATE INDEX IF NOT EXISTS ix_reminders_due
+        ON reminders (completed, remind_at)
+    """))
+    conn.execute(text("""
+        CREATE INDEX IF NOT EXISTS ix_matches_guild_week
+        ON one_on_one_matches (guild_id, week_start)
+    """))
+    conn.execute(text("""
+        CREATE INDEX IF NOT EXISTS ix_upc_last_journal
+        ON user_private_channels (guild_id, last_journal_message)
+    """))
+
+
+def migration_015_epoch_timestamps(conn):
+    """Store message_logs.timestamp, reminders.remind_at and user_private_channels.last_journal_message
+    as INTEGER unix-epoch seconds instead of ISO strings."""
+    columns = [
+        ("message_logs", "timestamp", "ix_message_logs_guild_user_ts", "guild_id, user_id, timestamp"),
+        ("reminders", "remind_at", "ix_reminders_due", "completed, remind_at"),
+        ("user_private_channels", "last_journal_message", "ix_upc_last_journal", "guild_id, last_journal_message"),
+    ]
+    for table, column, index, index_columns in columns:
+        if _column_type(conn, table, column) not in ("TEXT", "VARCHAR"):
+            continue
+        # SQLite can't drop an indexed column, so rebuild the index around the swap
+        conn.execute(text(f"DROP INDEX IF EXISTS {index}"))
+        conn.execute(text(f"ALTER TABLE {table} ADD COLUMN {column}_epoch BIGINT"))
+        conn.execute(text(f"UPDATE {table} SET {column}_epoch = CAST(strftime('%s', {column}) AS INTEGER)"))
+        conn.execute(text(f"ALTER TABLE {table} DROP COLUMN {column}"))
+        conn.execute(text(f"ALTER TABLE {table} RENAME COLUMN {column}_epoch TO {column}"))
+        conn.execute(text(f"CREATE INDEX IF NOT EXISTS {index} ON {table} ({index_columns})"))
+
+
+def migration_016_pool_epoch_buckets(conn):
+    """Store one_on_one_pool.skip_until and sat_out_at as INTEGER unix-epoch seconds and index
+    them per guild, so the weekly matcher's availability checks are integer range scans."""
+    for column in ("skip_until", "sat_out_at"):
+        if _column_type(conn, "one_on_one_pool", column) not in ("TEXT", "VARCHAR"):
+            continue
+        conn.execute(text(f"ALTER TABLE one_on_one_pool ADD COLUMN {column}_epoch BIGINT"))
+        conn.execute(text(f"UPDATE one_on_one_pool SET {column}_epoch = CAST(strftime('%s', {column}) AS INTEGER)"))
+        conn.execute(text(f"ALTER TABLE one_on_one_pool DROP COLUMN {column}"))
+        conn.execute(text(f"ALTER TABLE one_on_one_pool RENAME COLUMN {column}_epoch TO {column}"))
+    conn.execute(text("CREATE INDEX IF NOT EXISTS ix_pool_skip ON one_on_one_pool (guild_id, skip_until)"))
+    conn.execute(text("CREATE INDEX IF NOT EXISTS ix_pool_sat_out ON one_on_one_pool (guild_id, sat_out_at)"))
+
+
+def migration_017_milli_xp(conn):
+    """Store user_xp.xp and message_logs.xp_awarded as INTEGER milli-XP instead of NUMERIC(10, 3)."""
+    for table, column in (("user_xp", "xp"), ("message_logs", "xp_awarded")):
+        if not (_column_type(conn, table, column) or "").startswith("NUMERIC"):
+            continue
+        conn.execute(text(f"ALTER TABLE {table} ADD COLUMN {column}_milli INTEGER NOT NULL DEFAULT 0"))
+        conn.execute(text(f"UPDATE {table} SET {column}_milli = CAST(round({column} * 1000) AS INTEGER)"))
+        conn.execute(text(f"ALTER TABLE {table} DROP COLUMN {column}"))
+        conn.execute(text(f"ALTER TABLE {table} RENAME COLUMN {column}_milli TO {column}"))
+
+
 MIGRATIONS = [
     ("001_create_guild_settings", migration_001_create_guild_settings),
     ("002_add_last_journal_message", migration_002_add_last_journal_message),
@@ -167,6 +253,11 @@ MIGRATIONS = [
     ("010_create_channel_messages", migration_010_create_channel_messages),
     ("011_add_memory_notes", migration_011_add_memory_notes),
     ("012_add_wakeup_channel_id", migration_012_add_wakeup_channel_id),
+    ("013_create_user_last_posts", migration_013_create_user_last_posts),
+    ("014_add_query_indexes", migration_014_add_query_indexes),
+    ("015_epoch_timestamps", migration_015_epoch_timestamps),
+    ("016_pool_epoch_buckets", migration_016_pool_epoch_buckets),
+    ("017_milli_xp", migration_017_milli_xp),
 ]
 
 
@@ -176,6 +267,11 @@ def run_migrations():
     engine = create_engine(sync_url)
 
     with engine.connect() as conn:
+        # user_version mirrors the migrations table; when it's current there is nothing to do
+        if conn.execute(text("PRAGMA user_version")).scalar() == len(MIGRATIONS):
+            engine.dispose()
+            return
+
         # Create migrations tracking table if it doesn't exist
         conn.execute(text("""
             CREATE TABLE IF NOT EXISTS migrations (
@@ -198,4 +294,7 @@ def run_migrations():
                 conn.commit()
                 print(f"Migration {name} complete")
 
+        conn.execute(text(f"PRAGMA user_version = {len(MIGRATIONS)}"))
+        conn.commit()
+
     engine.dispose()
@@ -1,4 +1,4 @@
-from sqlalchemy import Table, Column, Integer, BigInteger, MetaData, String, ForeignKey, Numeric, DateTime
+from sqlalchemy import Table, Column, Integer, BigInteger, MetaData, String, ForeignKey, Float
 from sqlalchemy.sql import func
 
 metadata = MetaData()
@@ -25,7 +25,7 @@ user_private_channels = Table(
     Column("user_id", BigInteger, ForeignKey("users.user_id"), primary_key=True),
     Column("channel_id", BigInteger, nullable=False),
     Column("created_at", String, server_default=func.now()),
-    Column("last_journal_message", String, nullable=True)
+    Column("last_journal_message", BigInteger, nullable=True)
 )
 
 user_xp = Table(
@@ -33,7 +33,7 @@ user_xp = Table(
     metadata,
     Column("guild_id", BigInteger, ForeignKey("guilds.guild_id"), primary_key=True),
     Column("user_id", BigInteger, ForeignKey("users.user_id"), primary_key=True),
-    Column("xp", Numeric(10, 3), nullable=False, default=0),
+    Column("xp", Integer, nullable=False, default=0),  # milli-XP
     Column("updated_at", String, server_default=func.now())
 )
 
@@ -43,8 +43,8 @@ message_logs = Table(
     Column("id", Integer, primary_key=True, autoincrement=True),
     Column("guild_id", BigInteger, ForeignKey("guilds.guild_id"), nullable=False),
     Column("user_id", BigInteger, ForeignKey("users.user_id"), nullable=False),
-    Column("timestamp", String, nullable=False),
-    Column("xp_awarded", Numeric(10, 3), nullable=False)
+    Column("timestamp", BigInteger, nullable=False),
+    Column("xp_awarded", Integer, nullable=False)  # milli-XP
 )
 
 guild_settings = Table(
@@ -65,7 +65,7 @@ reminders = Table(
     Column("channel_id", BigInteger, nullable=False),
     Column("message_link", String, nullable=False),
     Column("message_preview", String, nullable=True),
-    Column("remind_at", String, nullable=False),
+    Column("remind_at", BigInteger, nullable=False),
     Column("created_at", String, server_default=func.now()),
     Column("completed", Integer, server_default="0")
 )
@@ -76,8 +76,8 @@ one_on_one_pool = Table(
     Column("guild_id", BigInteger, primary_key=True),
     Column("user_id", BigInteger, primary_key=True),
     Column("joined_at", String, server_default=func.now()),
-    Column("skip_until", String, nullable=True),
-    Column("sat_out_at", String, nullable=True)
+    Column("skip_until", BigInteger, nullable=True),
+    Column("sat_out_at", BigInteger, nullable=True)
 )
 
 one_on_one_matches = Table(
@@ -131,4 +131,12 @@ channel_messages = Table(
     Column("attachment_text", String, nullable=True),
     Column("discord_message_id", BigInteger, nullable=False, unique=True),
     Column("created_at", String, nullable=False),
-)
\ No newline at end of file
+)
+
+user_last_posts = Table(
+    "user_last_posts",
+    metadata,
+    Column("channel_id", BigInteger, primary_key=True),
+    Column("user_id", BigInteger, primary_key=True),
+    Column("posted_at", Float, nullable=False),
+)
@@ -105,7 +105,9 @@ async def main():
         print("Connecting to Discord...")
         await bot.start(token)
     finally:
-        # Disconnect from the database when the bot shuts down
+        # Write any buffered message logs, then disconnect from the database
+        from db.actions import flush_message_logs
+        await flush_message_logs()
         await database.disconnect()
 
 